@@ -0,0 +1,152 @@
+import argparse
+import asyncio
+import datetime
+import sys
+import tempfile
+import threading
+import time
+
+from aiohttp import web
+
+from benchmarks.synthetic import synthetic_games
+from chess_com.archive_cache import ArchiveCache
+from chess_com.async_api import iter_archives
+
+# Checks chess_com.async_api.iter_archives against a local stub of the chess.com monthly archive endpoint:
+# archives come back in request order with their games, 429 and 503 answers are retried, no more than
+# max_concurrency requests are in flight, an ArchiveCache serves complete months without a request and
+# revalidates the current one, and a 404 is raised to the caller. Exits with status 1 on any failure.
+# Run with `python -m benchmarks.fetch`.
+
+PLAYERS = ['stub_player', 'stub_opponent']
+# Archives answered with these statuses before the games, per (username, month index)
+FAILURES = {('stub_player', 1): [429], ('stub_player', 3): [503, 503], ('stub_opponent', 0): [503]}
+ETAG = '"stub"'
+
+
+class ArchiveServer:
+    """
+    Local stub of the monthly archive endpoint, run on its own event loop in a background thread.
+    Answers with synthetic games after the scripted failures of each archive, and counts the requests.
+    """
+
+    def __init__(self, months, delay=0.02):
+        self.months = months
+        self.delay = delay
+        self.failures = {}
+        self.requests = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.not_modified = 0
+        self.loop = asyncio.new_event_loop()
+        self.port = None
+
+    def archive(self, username, year, month):
+        return synthetic_games(3, username, seed=year * 12 + month)
+
+    async def handle(self, request):
+        username, year, month = (request.match_info['username'], int(request.match_info['year']),
+                                 int(request.match_info['month']))
+        key = (username, year, month)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+
+        if username not in PLAYERS:
+            return web.json_response({'message': 'User not found'}, status=404)
+        failures = self.failures.setdefault(key, list(FAILURES.get((username, self.months.index((year, month))), [])))
+        if failures:
+            return web.json_response({}, status=failures.pop(0), headers={'Retry-After': '0'})
+        if request.headers.get('If-None-Match') == ETAG:
+            self.not_modified += 1
+            return web.Response(status=304, headers={'ETag': ETAG})
+        return web.json_response({'games': self.archive(username, year, month)}, headers={'ETag': ETAG})
+
+    def start(self):
+        app = web.Application()
+        app.router.add_get('/pub/player/{username}/games/{year}/{month}', self.handle)
+        runner = web.AppRunner(app)
+        self.loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        self.loop.run_until_complete(site.start())
+        self.port = runner.addresses[0][1]
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        return self
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.port}/pub/player/{{username}}/games/{{year}}/{{month:02d}}'
+
+    def reset(self):
+        self.requests.clear()
+        self.max_in_flight = 0
+        self.not_modified = 0
+
+
+def stub_months(num_months):
+    """ The last *num_months* (year, month) archives, the current month included. """
+    today = datetime.date.today()
+    index = today.year * 12 + today.month - 1
+    return [(month // 12, month % 12 + 1) for month in range(index - num_months + 1, index + 1)]
+
+
+def check(failed, condition, message):
+    print(('ok   ' if condition else 'FAIL ') + message)
+    return failed or not condition
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the archive fetcher against a local stub of chess.com.')
+    parser.add_argument('--months', type=int, default=6, help='Archives per player')
+    parser.add_argument('--max-concurrency', type=int, default=3)
+    args = parser.parse_args()
+
+    months = stub_months(args.months)
+    server = ArchiveServer(months).start()
+    archives = {username: months for username in PLAYERS}
+    options = {'base_url': server.base_url, 'rate': 1000, 'max_concurrency': args.max_concurrency, 'backoff': 0.01}
+    failed = False
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ArchiveCache(directory)
+        start = time.perf_counter()
+        fetched = list(iter_archives(archives, cache=cache, **options))
+        seconds = time.perf_counter() - start
+        expected = [(username, year, month) for username in PLAYERS for year, month in months]
+        failed = check(failed, [item[:3] for item in fetched] == expected, 'archives are yielded in request order')
+        failed = check(failed, all(games == server.archive(*item[:3]) for *item, games in fetched),
+                       'archives hold the games served')
+        retries = {(username, months[index]): len(statuses) + 1 for (username, index), statuses in FAILURES.items()}
+        failed = check(failed, all(server.requests[(username, *month)] == count
+                                   for (username, month), count in retries.items()),
+                       f'429 and 503 answers are retried ({sum(retries.values())} requests for {len(retries)} archives)')
+        failed = check(failed, sum(server.requests.values()) == len(expected) + sum(retries.values()) - len(retries),
+                       'other archives are requested once')
+        failed = check(failed, 1 < server.max_in_flight <= args.max_concurrency,
+                       f'{server.max_in_flight} requests in flight at most, max_concurrency {args.max_concurrency}')
+        print(f'{len(fetched)} archives in {seconds:.2f}s')
+
+        server.reset()
+        list(iter_archives(archives, cache=cache, **options))
+        failed = check(failed, cache.stats() == {'hits': len(expected) - len(PLAYERS), 'revalidated': len(PLAYERS),
+                                                 'downloaded': len(expected)},
+                       f'the cache serves complete months and revalidates the current one: {cache.stats()}')
+        failed = check(failed, server.not_modified == len(PLAYERS) and sum(server.requests.values()) == len(PLAYERS),
+                       'only the current months are requested again, and answered 304')
+
+    try:
+        list(iter_archives({'unknown_player': months[:1]}, **options))
+        failed = check(failed, False, 'a 404 is raised')
+    except Exception as error:
+        failed = check(failed, getattr(error, 'status', None) == 404, f'a 404 is raised: {type(error).__name__}')
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+import argparse
+import random
+import sys
+import time
+
+import chess
+import numpy as np
+
+from benchmarks.reference_metrics import reference_metrics
+from benchmarks.synthetic import synthetic_games
+from model.bitboard_features import METRIC_NAMES
+from model.features import compute_forks, evaluate_fens_matrix
+from model.preprocess import preprocess_games
+
+# Checks that every feature backend, compile_game_metrics included, computes the same metrics as the
+# square-loop reference in benchmarks.reference_metrics, position by position, on the player positions
+# of synthetic games and on random play from positions where promotions, en passant captures, checks and
+# pins come up often. The drift of the 'fast' forks mode from the 'exact' one is also measured for both
+# colors of every position. Exits with status 1 on any mismatch or on more fork drift than --max-fork-drift.
+# Run with `python -m benchmarks.parity` before changing a metric kernel.
+
+USERNAME = 'parity_player'
+BACKENDS = ['python', 'bitboard', 'batch', 'python-fast-forks']
+# Random play starts from these too: pawns about to promote on both sides, with and without pieces to
+# capture on the promotion squares, an en passant capture, pinned pieces and a king in check.
+START_FENS = [
+    chess.STARTING_FEN,
+    'r3k2r/1P4P1/8/8/8/8/1p4p1/R3K2R w KQkq - 0 1',
+    'n1b1k3/PP5P/8/8/8/8/2p3pp/4K1NB w - - 0 1',
+    'rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3',
+    '4k3/4r3/8/1b6/8/3N4/4B3/4K3 w - - 0 1',
+    'r1bqk2r/pppp1ppp/2n2n2/4p3/1bB1P3/2NP1N2/PPP2PPP/R1BQK2R b KQkq - 0 5',
+    'rnbqkbnr/ppp2ppp/8/1B1pp3/4P3/8/PPPP1PPP/RNBQK1NR b KQkq - 1 3'
+]
+
+
+def random_play(rng, board, max_plies):
+    """
+    Plays random legal moves from *board*, mostly promotions, captures and checks, and returns the FEN
+    after every move.
+    """
+    board = board.copy()
+    fens = []
+    for _ in range(max_plies):
+        moves = list(board.legal_moves)
+        if not moves:
+            break
+        if rng.random() < 0.6:
+            moves = [move for move in moves
+                     if move.promotion or board.is_capture(move) or board.gives_check(move)] or moves
+        board.push(rng.choice(moves))
+        fens.append(board.fen())
+    return fens
+
+
+def parity_positions(num_games, seed=0):
+    """
+    Returns the player FENs of *num_games* synthetic games followed by FENs of random play from
+    START_FENS.
+    """
+    processed = preprocess_games(synthetic_games(num_games, USERNAME, seed), 'blitz', USERNAME, parser='tokens')
+    fens = [fen for game in processed for fen in game['Player FENs']]
+    rng = random.Random(seed)
+    for fen in START_FENS:
+        for _ in range(max(num_games // 4, 1)):
+            fens.extend(random_play(rng, chess.Board(fen), 60))
+    return fens
+
+
+def coverage(fens):
+    """ Counts the positions in check, with a legal promotion and with an en passant square. """
+    counts = {'positions': len(fens), 'check': 0, 'promotion': 0, 'en_passant': 0}
+    for fen in fens:
+        board = chess.Board(fen)
+        counts['check'] += board.is_check()
+        counts['promotion'] += any(move.promotion for move in board.legal_moves)
+        counts['en_passant'] += board.ep_square is not None
+    return counts
+
+
+def compare(expected, actual, fens, max_examples=3):
+    """
+    Returns the number of positions whose metrics differ from *expected*, the mismatches per metric and
+    a few mismatching FENs.
+    """
+    mismatches = expected != actual
+    rows = np.flatnonzero(mismatches.any(axis=1))
+    per_metric = {name: int(count) for name, count in zip(METRIC_NAMES, mismatches.sum(axis=0)) if count}
+    return {'positions': int(len(rows)), 'per_metric': per_metric, 'examples': [fens[row] for row in rows[:max_examples]]}
+
+
+def fork_drift(fens):
+    """
+    Compares compute_forks in the 'fast' mode with the 'exact' one for both colors of every position,
+    the player who just moved as in the pipeline and the player to move. Returns the share of differing
+    counts, their mean absolute difference and the time per call of each mode.
+    """
+    boards = [(chess.Board(fen), color) for fen in fens for color in chess.COLORS]
+    counts = {}
+    results = {'calls': len(boards)}
+    for mode in ('exact', 'fast'):
+        start = time.perf_counter()
+        counts[mode] = np.array([compute_forks(board, color, mode) for board, color in boards])
+        results[f'{mode}_us_per_call'] = (time.perf_counter() - start) / len(boards) * 1e6
+    difference = np.abs(counts['fast'] - counts['exact'])
+    results['drift'] = float(np.mean(difference > 0))
+    results['mean_abs_difference'] = float(np.mean(difference))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that the feature backends match the reference metrics.')
+    parser.add_argument('--games', type=int, default=100, help='Synthetic games, random play scales with it')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-fork-drift', type=float, default=0.0,
+                        help="Share of fork counts the 'fast' mode may get wrong")
+    args = parser.parse_args()
+
+    fens = parity_positions(args.games, args.seed)
+    print(coverage(fens))
+    expected = np.array([reference_metrics(fen) for fen in fens], dtype=np.float32)
+
+    failed = False
+    for backend in BACKENDS:
+        result = compare(expected, evaluate_fens_matrix(fens, backend), fens)
+        print(backend, result)
+        failed = failed or result['positions'] > 0
+
+    drift = fork_drift(fens)
+    print('fork drift', drift)
+    failed = failed or drift['drift'] > args.max_fork_drift
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+import argparse
+import copy
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import chess
+import numpy as np
+
+from benchmarks.synthetic import synthetic_games
+from model.bitboard_features import STATIC_METRICS
+from model.feature_sets import resolve_features
+from model.feature_store import FeatureStore
+from model.features import METRIC_GROUP_FUNCTIONS, generate_features, get_metrics_backend
+from model.preparation import feature_names, playable_games, prepare_data
+from model.preprocess import preprocess_games
+from model.tensorize import tensorize
+from model.worker_pool import FeaturePool
+
+# End-to-end throughput of the pipeline stages on synthetic blitz corpora of several sizes.
+# Run with `python -m benchmarks.pipeline --output results.json` and compare the files across commits.
+
+USERNAME = 'bench_player'
+STAGES = ['preprocess', 'feature_functions', 'features', 'feature_sets', 'prepare_data', 'tensorization', 'inference']
+BACKENDS = ['python', 'bitboard', 'batch']
+# Single board metric kernels, see bench_feature_functions
+KERNEL_BACKENDS = ['python', 'python-fast-forks', 'bitboard']
+# Feature sets timed on the batch backend, to see what leaving metric groups out saves
+FEATURE_SETS = {
+    'all': None,
+    'without_tactical': ['king_safety', 'piece_activity', 'material_balance', 'positional_features'],
+    'without_moves': [name for name in resolve_features() if name not in ('Mobility', 'Forks', 'Threats')],
+    'static': list(STATIC_METRICS)
+}
+
+
+def timed(func, repeats=1):
+    """
+    Runs *func* *repeats* times and returns its last result and the best wall time in seconds.
+    """
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def rate(seconds, items, unit):
+    return {'seconds': seconds, unit: items, f'{unit}_per_s': items / seconds if seconds else None}
+
+
+def bench_preprocess(games, repeats):
+    results = {}
+    for name, kwargs in (('pgn', {'parser': 'pgn'}), ('tokens', {'parser': 'tokens'}),
+                         ('tokens_with_metrics', {'parser': 'tokens', 'with_metrics': True})):
+        _, seconds = timed(lambda: preprocess_games(games, 'blitz', USERNAME, **kwargs), repeats)
+        results[name] = rate(seconds, len(games), 'games')
+    return results
+
+
+def bench_feature_functions(fens, repeats):
+    """
+    Per-position cost of each metric group of compile_game_metrics, for the player who just moved, and of
+    the whole single board kernel of each backend. Boards are parsed outside of the measurements.
+    """
+    boards = [chess.Board(fen) for fen in fens]
+    results = {}
+    for name, func in METRIC_GROUP_FUNCTIONS.items():
+        _, seconds = timed(lambda: [func(board, not board.turn) for board in boards], repeats)
+        results[name] = {'us_per_position': seconds / len(boards) * 1e6, 'positions': len(boards)}
+    for backend in KERNEL_BACKENDS:
+        compile_metrics = get_metrics_backend(backend)
+        _, seconds = timed(lambda: [compile_metrics(board) for board in boards], repeats)
+        results[f'all[{backend}]'] = {'us_per_position': seconds / len(boards) * 1e6, 'positions': len(boards)}
+    return results
+
+
+def bench_features(processed, pool, repeats):
+    positions = sum(len(game['Player FENs']) for game in processed)
+    results = {}
+    for backend in BACKENDS:
+        def run():
+            return generate_features(copy.deepcopy(processed), backend=backend, pool=pool)
+        df, seconds = timed(run, repeats)
+        results[backend] = rate(seconds, positions, 'positions')
+    return results, df
+
+
+def bench_feature_sets(processed, pool, repeats):
+    positions = sum(len(game['Player FENs']) for game in processed)
+    results = {}
+    for name, features in FEATURE_SETS.items():
+        def run():
+            return generate_features(copy.deepcopy(processed), backend='batch', pool=pool, features=features)
+        _, seconds = timed(run, repeats)
+        results[name] = {**rate(seconds, positions, 'positions'), 'metrics': len(resolve_features(features))}
+    return results
+
+
+def bench_inference(X, repeats, runtimes):
+    from model.numpy_runtime import NumpyModel, export_model
+    from model.training import build_model
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        model_path = os.path.join(directory, 'bench_model.keras')
+        model = build_model(X.shape[1:])
+        model.save(model_path)
+        predictors = {'numpy': NumpyModel(export_model(model_path)).predict}
+        if 'tensorflow' in runtimes:
+            import tensorflow as tf
+
+            signature = [tf.TensorSpec((None,) + X.shape[1:], tf.float32)]
+            forward = tf.function(lambda X: model(X, training=False), input_signature=signature)
+            predictors['tensorflow'] = lambda X: forward(X).numpy()
+
+        for runtime in runtimes:
+            predict = predictors[runtime]
+            predict(X[:1])
+            _, batch_seconds = timed(lambda: predict(X), repeats)
+            single = [timed(lambda: predict(X[index:index + 1]))[1] for index in range(min(len(X), 100))]
+            results[runtime] = {**rate(batch_seconds, len(X), 'games'),
+                                'single_game_p50_ms': float(np.percentile(single, 50) * 1000)}
+    return results
+
+
+def bench_size(num_games, stages, pool, repeats, runtimes):
+    games = synthetic_games(num_games)
+    processed = preprocess_games(games, 'blitz', USERNAME, parser='tokens')
+    fens = [fen for game in processed for fen in game['Player FENs']]
+    results = {'games': len(games), 'positions': len(fens)}
+
+    if 'preprocess' in stages:
+        results['preprocess'] = bench_preprocess(games, repeats)
+    if 'feature_functions' in stages:
+        results['feature_functions'] = bench_feature_functions(fens[:2000], repeats)
+
+    if 'features' in stages:
+        results['features'], df = bench_features(processed, pool, repeats)
+    else:
+        df = generate_features(copy.deepcopy(processed), backend='batch', pool=pool)
+    if 'feature_sets' in stages:
+        results['feature_sets'] = bench_feature_sets(processed, pool, repeats)
+
+    if 'prepare_data' in stages:
+        _, seconds = timed(lambda: prepare_data(df.copy()), repeats)
+        results['prepare_data'] = rate(seconds, len(df), 'games')
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = FeatureStore(os.path.join(directory, 'features'))
+        _, seconds = timed(lambda: (store.clear(USERNAME), store.append(USERNAME, df)))
+        arrays = store.load_arrays(USERNAME)
+        games_index = np.column_stack([np.zeros(len(df), dtype=np.int64), np.arange(len(df))])
+        games_index = games_index[playable_games(arrays)]
+        labels = np.zeros(len(games_index))
+
+        def run():
+            tensors_path = tempfile.mkdtemp(dir=directory)
+            return tensorize(store, [USERNAME], games_index, labels, path=tensors_path)
+        (X, _, _), tensorize_seconds = timed(run, repeats)
+        X = np.array(X)
+        if 'tensorization' in stages:
+            results['tensorization'] = {'store_append': rate(seconds, len(df), 'games'),
+                                        'tensorize': rate(tensorize_seconds, len(X), 'games'),
+                                        'features': len(feature_names(arrays))}
+
+    if 'inference' in stages and len(X):
+        results['inference'] = bench_inference(X, repeats, runtimes)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline stages on synthetic blitz games.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 200, 800], help='Numbers of games')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--runtimes', nargs='+', choices=['numpy', 'tensorflow'], default=['numpy', 'tensorflow'])
+    parser.add_argument('--processes', type=int, help='Feature worker processes, all CPUs by default')
+    parser.add_argument('--repeats', type=int, default=1, help='Runs per measurement, the best one is kept')
+    parser.add_argument('--output', help='JSON file of the results, printed to stdout otherwise')
+    args = parser.parse_args()
+
+    results = {
+        'commit': git_commit(),
+        'python': sys.version.split()[0],
+        'cpu_count': os.cpu_count(),
+        'sizes': {}
+    }
+    with FeaturePool(args.processes) as pool:
+        # Start the workers outside of the measurements
+        generate_features(preprocess_games(synthetic_games(20, seed=1), 'blitz', USERNAME), backend='batch', pool=pool)
+        for num_games in args.sizes:
+            print(f"Benchmarking {num_games} games...", file=sys.stderr)
+            results['sizes'][num_games] = bench_size(num_games, args.stages, pool, args.repeats, args.runtimes)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
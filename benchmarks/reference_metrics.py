@@ -0,0 +1,252 @@
+import chess
+
+from model.bitboard_features import METRIC_NAMES
+
+# The square-loop metric implementations compile_game_metrics started from, kept as an independent
+# reference for benchmarks.parity: nothing here is shared with the python, bitboard or batch backends,
+# so a change to a shared helper or constant cannot make a backend agree with itself. Every function
+# evaluates the player who just moved by flipping board.turn, as the original code did. Slow on purpose;
+# do not optimize or import from the model package beyond METRIC_NAMES.
+
+PIECE_VALUES = {chess.PAWN: 1, chess.KNIGHT: 3, chess.BISHOP: 3, chess.ROOK: 5, chess.QUEEN: 9, chess.KING: 0}
+
+
+def reference_metrics(fen):
+    """ Returns the metrics of the player who just moved in *fen*, in METRIC_NAMES order. """
+    board = chess.Board(fen)
+    metrics = {
+        **compute_king_safety_metrics(board),
+        **compute_piece_activity_metrics(board),
+        **compute_material_balance_metrics(board),
+        **compute_positional_features_metrics(board),
+        **compute_tactical_features(board)
+    }
+    return [metrics[name] for name in METRIC_NAMES]
+
+
+def compute_king_safety_metrics(board):
+    current_turn_king_square = board.king(not board.turn)
+    next_turn_king_square = board.king(board.turn)
+
+    # Pieces of the player who just moved attacking the squares around the opponent's king
+    attacker_score = 0
+    for square in squares_around(next_turn_king_square):
+        attackers = board.attackers(not board.turn, square)
+        attacker_score += sum(PIECE_VALUES[board.piece_at(attacker).piece_type] for attacker in attackers)
+
+    # Pieces of the player who just moved covering the squares around their own king
+    defender_score = 0
+    for square in squares_around(current_turn_king_square):
+        defenders = board.attackers(not board.turn, square)
+        defender_score += sum(PIECE_VALUES[board.piece_at(defender).piece_type] for defender in defenders)
+
+    return {
+        'Attacker Score': attacker_score,
+        'Defender Score': defender_score,
+        'Pawn Shield': compute_pawn_shield_strength(board, current_turn_king_square),
+        'Open Files': compute_open_files_near_king(board, current_turn_king_square)
+    }
+
+
+def squares_around(square):
+    file = chess.square_file(square)
+    rank = chess.square_rank(square)
+    result = []
+    for df, dr in [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]:
+        f, r = file + df, rank + dr
+        if 0 <= f < 8 and 0 <= r < 8:
+            result.append(chess.square(f, r))
+    return result
+
+
+def compute_pawn_shield_strength(board, king_square):
+    return sum(1 for pawn_square in board.pieces(chess.PAWN, not board.turn)
+               if chess.square_distance(pawn_square, king_square) == 1)
+
+
+def compute_open_files_near_king(board, king_square):
+    open_files = 0
+    king_file = chess.square_file(king_square)
+    for file in (king_file - 1, king_file, king_file + 1):
+        if 0 <= file <= 7 and is_file_open_or_semi_open(board, file, not board.turn):
+            open_files += 1
+    return open_files
+
+
+def is_file_open_or_semi_open(board, file, color):
+    for rank in range(8):
+        piece = board.piece_at(chess.square(file, rank))
+        if piece and piece.piece_type == chess.PAWN and piece.color == color:
+            return False
+    return True
+
+
+def compute_piece_activity_metrics(board):
+    board.turn = not board.turn
+
+    mobility = sum(PIECE_VALUES[board.piece_at(move.from_square).piece_type] for move in board.legal_moves)
+
+    control_of_center = 0
+    for square in [chess.E4, chess.D4, chess.E5, chess.D5]:
+        if board.is_attacked_by(board.turn, square):
+            control_of_center += sum(PIECE_VALUES[board.piece_at(attacker).piece_type]
+                                     for attacker in board.attackers(board.turn, square))
+        piece = board.piece_at(square)
+        if piece and piece.color == board.turn:
+            control_of_center += PIECE_VALUES[piece.piece_type]
+
+    advanced_pawns = sum(1 for pawn in board.pieces(chess.PAWN, board.turn)
+                         if (chess.square_rank(pawn) < 4 if board.turn == chess.BLACK else chess.square_rank(pawn) > 3))
+    developed_pieces = calculate_developed_pieces(board)
+    space_control = sum(1 for square in chess.SQUARES if board.is_attacked_by(board.turn, square))
+
+    board.turn = not board.turn
+
+    return {
+        'Mobility': mobility,
+        'Control of Center': control_of_center,
+        'Advanced Pawns': advanced_pawns,
+        'Developed Pieces': developed_pieces,
+        'Space Control': space_control
+    }
+
+
+def calculate_developed_pieces(board):
+    developed_pieces = 0
+    for piece_type, positions in get_initial_positions(board.turn).items():
+        for position in positions:
+            if board.piece_at(position) is None or board.piece_at(position).piece_type != piece_type:
+                developed_pieces += 1
+    return developed_pieces
+
+
+def get_initial_positions(color):
+    back_rank = 0 if color == chess.WHITE else 7
+    pawn_rank = 1 if color == chess.WHITE else 6
+    return {
+        chess.PAWN: [chess.square(file, pawn_rank) for file in range(8)],
+        chess.KNIGHT: [chess.square(1, back_rank), chess.square(6, back_rank)],
+        chess.BISHOP: [chess.square(2, back_rank), chess.square(5, back_rank)],
+        chess.ROOK: [chess.square(0, back_rank), chess.square(7, back_rank)],
+        chess.QUEEN: [chess.square(3, back_rank)],
+        chess.KING: [chess.square(4, back_rank)]
+    }
+
+
+def compute_material_balance_metrics(board):
+    board.turn = not board.turn
+    total_material = sum((len(board.pieces(piece_type, board.turn)) - len(board.pieces(piece_type, not board.turn))) * value
+                         for piece_type, value in PIECE_VALUES.items())
+    board.turn = not board.turn
+    return {'Total Material': total_material}
+
+
+def compute_positional_features_metrics(board):
+    board.turn = not board.turn
+    pawn_structure = compute_pawn_structure_metrics(board)
+    piece_coordination = compute_piece_coordination_metrics(board)
+    board.turn = not board.turn
+    return {**pawn_structure, 'Piece Coordination': piece_coordination}
+
+
+def compute_pawn_structure_metrics(board):
+    doubled_pawns = 0
+    isolated_pawns = 0
+    passed_pawns = 0
+    pawns = board.pieces(chess.PAWN, board.turn)
+    for square in pawns:
+        file = chess.square_file(square)
+        rank = chess.square_rank(square)
+
+        if sum(1 for sq in pawns if chess.square_file(sq) == file) > 1:
+            doubled_pawns += 1
+
+        if not any(abs(chess.square_file(sq) - file) == 1 for sq in pawns):
+            isolated_pawns += 1
+
+        # Passed means no opponent piece, not only pawns, on the squares ahead on the same file
+        if board.turn == chess.WHITE:
+            ahead_squares = [chess.square(file, r) for r in range(rank + 1, 8)]
+        else:
+            ahead_squares = [chess.square(file, r) for r in range(rank - 1, -1, -1)]
+        if all(board.piece_at(sq) is None or board.piece_at(sq).color == board.turn for sq in ahead_squares):
+            passed_pawns += 1
+
+    return {
+        'Doubled Pawns': doubled_pawns,
+        'Isolated Pawns': isolated_pawns,
+        'Passed Pawns': passed_pawns
+    }
+
+
+def compute_piece_coordination_metrics(board):
+    piece_coordination = 0
+    for square in board.piece_map():
+        if board.piece_at(square).color == board.turn:
+            piece_coordination += sum(1 for defender in board.attackers(board.turn, square)
+                                      if board.piece_at(defender).color == board.turn)
+    return piece_coordination
+
+
+def compute_tactical_features(board):
+    board.turn = not board.turn
+    forks = compute_forks(board)
+    pins, skewers = compute_pins_and_skewers(board)
+    threats = sum(1 for move in board.legal_moves if board.is_capture(move))
+    board.turn = not board.turn
+    return {'Forks': forks, 'Pins': pins, 'Skewers': skewers, 'Threats': threats}
+
+
+def compute_forks(board):
+    """ Legal moves after which the moved piece is attacked by two or more opponent pieces, one a knight or better. """
+    forks = 0
+    opponent_color = not board.turn
+    for move in board.legal_moves:
+        board.push(move)
+        if board.piece_at(move.to_square):
+            attacked_squares = {square for square in board.attackers(board.turn, move.to_square)
+                                if board.color_at(square) == opponent_color}
+            if len(attacked_squares) >= 2 and any(board.piece_at(square).piece_type >= chess.BISHOP
+                                                  for square in attacked_squares):
+                forks += 1
+        board.pop()
+    return forks
+
+
+def compute_pins_and_skewers(board):
+    pins = 0
+    skewers = 0
+    for square in board.piece_map():
+        if board.is_pinned(board.turn, square):
+            pins += 1
+        if is_potential_skewer(board, square):
+            skewers += 1
+    return pins, skewers
+
+
+def is_potential_skewer(board, square):
+    """
+    Walks the square index by each of the eight offsets, wrapping around the board edges as the original
+    did, and looks for a friendly piece behind the first piece met that is worth more than it.
+    """
+    piece = board.piece_at(square)
+    if piece is None:
+        return False
+
+    skewer_values = {**PIECE_VALUES, chess.KING: 100}
+    for direction in [8, -8, 1, -1, 9, 7, -7, -9]:
+        first_piece_encountered = None
+        current_square = square + direction
+        while 0 <= current_square < 64:
+            encountered_piece = board.piece_at(current_square)
+            if encountered_piece:
+                if first_piece_encountered is None:
+                    first_piece_encountered = encountered_piece
+                elif encountered_piece.color == piece.color:
+                    if skewer_values[encountered_piece.piece_type] > skewer_values[first_piece_encountered.piece_type]:
+                        return True
+                    break
+                else:
+                    break
+            current_square += direction
+    return False
@@ -0,0 +1,127 @@
+import argparse
+import ast
+import gzip
+import inspect
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+
+import main as cli
+
+# Startup time of each main.py subcommand: a fresh interpreter importing main and running the import
+# statements of the subcommand function and of the main.py functions it calls, read from their source.
+# Commands that can run offline are also run end to end, so that a command broken past its imports
+# fails the benchmark instead of going unnoticed.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ['tensorflow', 'sklearn', 'pandas', 'aiohttp', 'chess']
+
+END_TO_END = {
+    'fetch': ['fetch', '--player', 'bench_player', '--players', 'bench_player', 'bench_opponent']
+}
+
+
+def command_imports(func, seen=None):
+    """
+    Returns the import statements of a main.py function and of the main.py functions it calls, in order.
+    """
+    seen = seen if seen is not None else {func}
+    statements = []
+    for node in ast.walk(ast.parse(textwrap.dedent(inspect.getsource(func)))):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            statements.append(ast.unparse(node))
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            callee = getattr(cli, node.func.id, None)
+            if inspect.isfunction(callee) and callee.__module__ == cli.__name__ and callee not in seen:
+                seen.add(callee)
+                statements.extend(command_imports(callee, seen))
+    return list(dict.fromkeys(statements))
+
+
+def commands():
+    """
+    Returns the import statements of every main.py subcommand, by name, 'help' importing main only.
+    """
+    parser = cli.build_parser()
+    subcommands = next(action for action in parser._actions if isinstance(action, argparse._SubParsersAction))
+    return {'help': [], **{name: command_imports(command.get_default('func'))
+                           for name, command in subcommands.choices.items()}}
+
+
+def startup_time(statements):
+    code = '; '.join(['import main'] + statements +
+                     [f'print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))'])
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', f'import json, sys; {code}'], cwd=ROOT, check=True,
+                            capture_output=True, text=True).stdout
+    return time.perf_counter() - start, json.loads(output.strip().splitlines()[-1])
+
+
+def seed_archives(directory, argv):
+    """
+    Stores synthetic archives of every month the *argv* command fetches in the archive cache under
+    *directory*, all marked complete so that the command makes no request.
+    """
+    from benchmarks.synthetic import synthetic_games
+    from chess_com.archive_cache import ArchiveCache
+    from main import build_parser, player_archives
+
+    cache = ArchiveCache(os.path.join(directory, 'data', 'archives'))
+    for username, months in player_archives(build_parser().parse_args(argv)).items():
+        for year, month in months:
+            path = cache.archive_path(username, year, month)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with gzip.open(path, 'wt', encoding='utf-8') as file:
+                json.dump({'games': synthetic_games(20, username, seed=year * 12 + month), 'etag': None,
+                           'last_modified': None, 'complete': True}, file)
+
+
+def command_time(argv):
+    """
+    Runs main.py with *argv* in a fresh interpreter, in a temporary directory holding its inputs.
+    Returns the wall time and the output of the command.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        seed_archives(directory, argv)
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, os.path.join(ROOT, 'main.py')] + argv, cwd=directory, check=True,
+                                capture_output=True, text=True).stdout
+        return time.perf_counter() - start, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the startup time of the main.py subcommands.')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--output', help='JSON file of the results, printed to stdout otherwise')
+    args = parser.parse_args()
+
+    results = {}
+    for command, statements in commands().items():
+        times, loaded = zip(*(startup_time(statements) for _ in range(args.repeats)))
+        results[command] = {'median_s': statistics.median(times), 'min_s': min(times), 'heavy_modules': loaded[0]}
+        print(f"{command}: {results[command]['median_s']:.3f}s, loads {', '.join(loaded[0]) or 'nothing heavy'}",
+              file=sys.stderr)
+
+    end_to_end = {}
+    for command, argv in END_TO_END.items():
+        times, outputs = zip(*(command_time(argv) for _ in range(args.repeats)))
+        end_to_end[command] = {'median_s': statistics.median(times), 'min_s': min(times)}
+        print(f"{command} end to end: {end_to_end[command]['median_s']:.3f}s", file=sys.stderr)
+        print(outputs[0], end='', file=sys.stderr)
+
+    output = json.dumps({'python': sys.version.split()[0], 'repeats': args.repeats, 'commands': results,
+                         'end_to_end': end_to_end}, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+import random
+
+import chess
+
+# Deterministic synthetic blitz games in the shape of chess.com monthly archive entries, with %clk
+# comments after every move, so that benchmarks run offline and on identical inputs across commits.
+
+OPENING_URLS = [
+    'Sicilian-Defense-Open', 'Italian-Game', 'Ruy-Lopez-Opening', 'French-Defense', 'Caro-Kann-Defense',
+    'Queens-Pawn-Opening', 'Kings-Indian-Defense', 'English-Opening', 'Scandinavian-Defense',
+    'London-System', 'Scotch-Game', 'Vienna-Game', 'Polish-Opening'
+]
+TIME_CONTROLS = ['180', '180+2', '300']
+
+
+def format_clock(seconds):
+    seconds = max(seconds, 0.0)
+    return f'{int(seconds // 3600)}:{int(seconds % 3600 // 60):02d}:{seconds % 60:04.1f}'
+
+
+def random_moves(rng, min_plies=30, max_plies=120):
+    """
+    Plays random legal moves, preferring captures and checks a little so games look less aimless.
+    Returns the board after the game and the SAN of its moves.
+    """
+    board = chess.Board()
+    sans = []
+    for _ in range(rng.randint(min_plies, max_plies)):
+        moves = list(board.legal_moves)
+        if not moves:
+            break
+        if rng.random() < 0.3:
+            moves = [move for move in moves if board.is_capture(move) or board.gives_check(move)] or moves
+        move = rng.choice(moves)
+        sans.append(board.san(move))
+        board.push(move)
+    return board, sans
+
+
+def synthetic_game(rng, username, index):
+    """
+    Returns one archive entry ({'pgn', 'time_class', 'url', ...}) of a random blitz game of *username*.
+    """
+    board, sans = random_moves(rng)
+    time_control = rng.choice(TIME_CONTROLS)
+    initial_time, _, increment = time_control.partition('+')
+    increment = int(increment or 0)
+    clocks = [float(initial_time), float(initial_time)]
+
+    movetext = []
+    for ply, san in enumerate(sans):
+        side = ply % 2
+        clocks[side] = clocks[side] - min(rng.expovariate(1 / 3.5), 30.0) + increment
+        prefix = f'{ply // 2 + 1}. ' if side == 0 else f'{ply // 2 + 1}... '
+        movetext.append(f'{prefix}{san} {{[%clk {format_clock(clocks[side])}]}}')
+
+    outcome = board.outcome()
+    result = outcome.result() if outcome else rng.choice(['1-0', '0-1', '1/2-1/2'])
+    white, black = (username, f'opponent{index}') if index % 2 == 0 else (f'opponent{index}', username)
+    url = f'https://www.chess.com/game/live/{1000000 + index}'
+    headers = {
+        'Event': 'Live Chess', 'Site': 'Chess.com', 'Date': '2024.01.01', 'Round': '-',
+        'White': white, 'Black': black, 'Result': result,
+        'WhiteElo': str(rng.randint(1200, 2200)), 'BlackElo': str(rng.randint(1200, 2200)),
+        'TimeControl': time_control, 'Termination': f'{username} won by resignation',
+        'ECOUrl': f'https://www.chess.com/openings/{rng.choice(OPENING_URLS)}', 'Link': url
+    }
+    pgn = '\n'.join(f'[{name} "{value}"]' for name, value in headers.items())
+    pgn += '\n\n' + ' '.join(movetext) + f' {result}\n'
+    return {
+        'url': url, 'pgn': pgn, 'time_control': time_control, 'time_class': 'blitz', 'rated': True,
+        'white': {'username': white, 'result': 'win'}, 'black': {'username': black, 'result': 'resigned'}
+    }
+
+
+def synthetic_games(num_games, username='bench_player', seed=0):
+    """
+    Returns *num_games* synthetic archive entries of *username*, the same ones for the same seed.
+    """
+    rng = random.Random(seed)
+    return [synthetic_game(rng, username, index) for index in range(num_games)]
@@ -0,0 +1,80 @@
+import datetime
+import gzip
+import json
+import os
+
+DEFAULT_ARCHIVE_PATH = 'data/archives'
+
+
+def is_month_complete(year, month, now=None):
+    """
+    Whether the (year, month) archive can no longer change, i.e. the month is over in UTC,
+    the timezone chess.com archives are split in.
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    return (year, month) < (now.year, now.month)
+
+
+class ArchiveCache:
+    """
+    On-disk store of monthly game archives keyed by (username, year, month), one gzipped JSON
+    file per archive holding the games and the ETag/Last-Modified validators of the response.
+
+    Archives downloaded after their month was over are immutable and served without any request,
+    the others are revalidated with a conditional request.
+    """
+
+    def __init__(self, path=DEFAULT_ARCHIVE_PATH):
+        self.path = path
+        self.hits = 0
+        self.revalidated = 0
+        self.downloaded = 0
+
+    def archive_path(self, username, year, month):
+        return os.path.join(self.path, username.lower(), f'{year}-{month:02d}.json.gz')
+
+    def load(self, username, year, month):
+        """
+        Returns the stored archive as a dict with 'games', 'etag', 'last_modified' and 'complete',
+        or None when the archive is not stored.
+        """
+        try:
+            with gzip.open(self.archive_path(username, year, month), 'rt', encoding='utf-8') as file:
+                return json.load(file)
+        except (FileNotFoundError, EOFError, json.JSONDecodeError):
+            return None
+
+    def store(self, username, year, month, games, etag=None, last_modified=None):
+        """
+        Stores an archive, marking it complete when its month is already over.
+        """
+        archive = {
+            'games': games,
+            'etag': etag,
+            'last_modified': last_modified,
+            'complete': is_month_complete(year, month)
+        }
+        path = self.archive_path(username, year, month)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so an interrupted run never leaves a truncated archive.
+        with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as file:
+            json.dump(archive, file)
+        os.replace(path + '.tmp', path)
+        return archive
+
+    def validators(self, archive):
+        """
+        Returns the conditional request headers revalidating a stored archive.
+        """
+        headers = {}
+        if archive.get('etag'):
+            headers['If-None-Match'] = archive['etag']
+        if archive.get('last_modified'):
+            headers['If-Modified-Since'] = archive['last_modified']
+        return headers
+
+    def stats(self):
+        """
+        Returns how many archives were served from disk, revalidated unchanged and downloaded.
+        """
+        return {'hits': self.hits, 'revalidated': self.revalidated, 'downloaded': self.downloaded}
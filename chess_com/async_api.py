@@ -0,0 +1,204 @@
+import asyncio
+import collections
+import datetime
+import queue
+import random
+import threading
+import time
+
+import aiohttp
+
+ARCHIVE_URL = "https://api.chess.com/pub/player/{username}/games/{year}/{month:02d}"
+USER_AGENT = "Chess Analysis (seva.archakov@gmail.com)"
+
+
+def archive_months(num_years=0, num_months=1, now=None):
+    """
+    Returns the (year, month) archives covered by fetch_games, from the month *num_years* years and
+    *num_months* months (of 30 days) ago up to the current month.
+    """
+    end_date = now or datetime.datetime.now()
+    start_date = end_date - datetime.timedelta(days=(365 * num_years + 30 * num_months))
+
+    months = []
+    year, month = start_date.year, start_date.month
+    while (year < end_date.year) or (year == end_date.year and month <= end_date.month):
+        months.append((year, month))
+        if month == 12:
+            month = 1
+            year += 1
+        else:
+            month += 1
+    return months
+
+
+class TokenBucket:
+    """
+    Rate limiter allowing *rate* requests per second on average, with bursts of up to *capacity*.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def retry_delay(response, attempt, backoff):
+    """
+    Returns how long to wait before retrying: the server's Retry-After when given, otherwise an
+    exponential backoff with jitter.
+    """
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    if retry_after is not None:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return backoff * 2 ** attempt * (1 + random.random())
+
+
+async def fetch_archive(session, limiter, semaphore, url, retries=5, backoff=0.5, headers=None):
+    """
+    Fetches one monthly archive, retrying on 429, 5xx and connection errors.
+
+    Returns the games and the ETag/Last-Modified validators of the response. The games are None when
+    the server answers 304 Not Modified to a conditional request made with *headers*.
+    """
+    for attempt in range(retries + 1):
+        await limiter.acquire()
+        response = None
+        try:
+            async with semaphore, session.get(url, headers=headers) as response:
+                validators = (response.headers.get('ETag'), response.headers.get('Last-Modified'))
+                if response.status == 304:
+                    return None, validators
+                if response.status != 429 and response.status < 500:
+                    response.raise_for_status()
+                    return (await response.json())['games'], validators
+                if attempt == retries:
+                    response.raise_for_status()
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if attempt == retries:
+                raise
+        await asyncio.sleep(retry_delay(response, attempt, backoff))
+
+
+async def fetch_cached_archive(session, limiter, semaphore, cache, username, year, month, url, retries=5, backoff=0.5):
+    """
+    Returns the games of one monthly archive from the ArchiveCache when it is complete, otherwise
+    revalidates or downloads it and updates the cache.
+    """
+    archive = cache.load(username, year, month)
+    if archive is not None and archive['complete']:
+        cache.hits += 1
+        return archive['games']
+
+    headers = cache.validators(archive) if archive is not None else None
+    games, (etag, last_modified) = await fetch_archive(session, limiter, semaphore, url, retries, backoff, headers)
+    if games is None:
+        cache.revalidated += 1
+        games = archive['games']
+        etag, last_modified = etag or archive['etag'], last_modified or archive['last_modified']
+    else:
+        cache.downloaded += 1
+    cache.store(username, year, month, games, etag, last_modified)
+    return games
+
+
+async def iter_archives_async(archives, max_pending=8, base_url=ARCHIVE_URL, rate=5, max_concurrency=8,
+                              retries=5, backoff=0.5, timeout=30, cache=None):
+    """
+    Fetches the monthly archives of every player concurrently and yields them as
+    (username, year, month, games), in archive order.
+
+    At most *max_pending* archives are fetched ahead of the one being yielded, so memory stays bounded
+    however long the history is. None fetches everything at once.
+    With an ArchiveCache only the archives that may have changed are requested.
+    """
+    limiter = TokenBucket(rate)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    connector = aiohttp.TCPConnector(limit=max_concurrency)
+    headers = {'User-Agent': USER_AGENT}
+
+    async with aiohttp.ClientSession(connector=connector, headers=headers,
+                                     timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        async def fetch(username, year, month):
+            url = base_url.format(username=username, year=year, month=month)
+            if cache is not None:
+                return await fetch_cached_archive(session, limiter, semaphore, cache, username, year, month,
+                                                  url, retries, backoff)
+            games, _ = await fetch_archive(session, limiter, semaphore, url, retries, backoff)
+            return games
+
+        requests = [(username, year, month) for username, months in archives.items() for year, month in months]
+        pending = collections.deque()
+        try:
+            for request in requests:
+                pending.append((request, asyncio.ensure_future(fetch(*request))))
+                if max_pending is not None and len(pending) >= max_pending:
+                    request, task = pending.popleft()
+                    yield (*request, await task)
+            while pending:
+                request, task = pending.popleft()
+                yield (*request, await task)
+        finally:
+            for _, task in pending:
+                task.cancel()
+
+
+def iter_archives(archives, max_pending=8, **kwargs):
+    """
+    Synchronous version of iter_archives_async. The archives are fetched in a background thread while
+    the caller processes the previous ones, with at most *max_pending* archives buffered. Closing the
+    generator, or an error in the caller, stops the fetching thread at its next archive.
+    """
+    items = queue.Queue(maxsize=max_pending or 0)
+    done = object()
+    stopped = threading.Event()
+
+    def put(item):
+        # Gives up once the caller stopped reading, instead of waiting forever for room in the queue
+        while not stopped.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    async def produce():
+        try:
+            async for item in iter_archives_async(archives, max_pending, **kwargs):
+                if not await asyncio.to_thread(put, item):
+                    return
+        except Exception as error:
+            await asyncio.to_thread(put, error)
+        else:
+            await asyncio.to_thread(put, done)
+
+    thread = threading.Thread(target=asyncio.run, args=(produce(),), daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+        thread.join()
+    finally:
+        stopped.set()
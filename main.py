@@ -1,66 +1,251 @@
-import pandas as pd
-from sklearn.model_selection import train_test_split
+import argparse
+import json
+import time
 
-from chess_com.api import fetch_games
-from model.preprocess import preprocess_games
-from model.features import generate_features
-from model.preparation import prepare_data
-from model.training import train_model
-from model.evaluation import evaluate_model
+from model.instrumentation import METRICS, iter_stages, positions_per_second, stage
 
-if __name__ == '__main__':
-    players = ["sevolod", "Moussako", "DraelicGambit", "omidabke",
-               "ilgong", "lavadva", "Almas1982qazaq", "Indraindrani", 
-               "mycostuff", "Tugrul107", "Edmond_baruti1", "MWonga",
-               "garchola", "baxtyaromer1", "SpasRT88", "rockistired"]
+# Subcommands import their dependencies when they run, so that fetching or featurizing never pays for
+# TensorFlow, scikit-learn or pandas it does not use. benchmarks/startup.py tracks the startup times.
+# Stages are recorded per player by model.instrumentation, see --metrics-log and --metrics-prometheus.
+
+PLAYERS = ["sevolod", "Moussako", "DraelicGambit", "omidabke",
+           "ilgong", "lavadva", "Almas1982qazaq", "Indraindrani",
+           "mycostuff", "Tugrul107", "Edmond_baruti1", "MWonga",
+           "garchola", "baxtyaromer1", "SpasRT88", "rockistired"]
+ANALYZED_PLAYER = "sevolod"
+GAME_TYPE = "blitz"
+
+
+def player_archives(args):
+    from chess_com.async_api import archive_months
+
+    return {username: archive_months(num_months=6 if username == args.player else 1) for username in args.players}
+
+
+def model_path(args):
+    return args.model or f'data/{args.player}_model.keras'
+
+
+def fetch(args):
+    """ Downloads the monthly archives of the players into the archive cache """
+    import itertools
+
+    from chess_com.archive_cache import ArchiveCache
+    from chess_com.async_api import iter_archives
+
+    archive_cache = ArchiveCache()
+    archives = iter_stages(iter_archives(player_archives(args), cache=archive_cache), 'fetch', 'player',
+                           key=lambda item: item[0], log=args.log)
+    # Archives arrive player by player, month by month
+    for username, months in itertools.groupby(archives, key=lambda item: item[0]):
+        print(f"{username}: {sum(len(games) for _, _, _, games in months)} games fetched")
+    print(f"Archive cache: {archive_cache.stats()}")
+
+
+def featurize(args):
+    """ Generates the features of the players' games into the feature store """
+    import contextlib
+    import itertools
 
-    analyzed_player = "sevolod"
-    game_type = "blitz"
+    from chess_com.archive_cache import ArchiveCache
+    from chess_com.async_api import iter_archives
+    from model.feature_cache import FeatureCache
+    from model.feature_store import FeatureStore
+    from model.pipeline import stream_features
+    from model.worker_pool import FeaturePool
+
+    feature_store = FeatureStore()
+    archive_cache = ArchiveCache()
+
+    # The workers are forked before iter_archives starts its fetching thread. On an error the workers are
+    # terminated, the cache is closed and closing the batches stops the fetching thread.
+    with FeaturePool(args.workers, args.chunk_size).start() as feature_pool, FeatureCache() as feature_cache:
+        print("Fetching games and generating features...")
+        feature_batches = stream_features(iter_archives(player_archives(args), cache=archive_cache), args.game_type,
+                                          parser='tokens', backend='batch', cache=feature_cache, pool=feature_pool,
+                                          features=args.features)
+        feature_batches = iter_stages(feature_batches, 'featurize', 'player', key=lambda item: item[0], log=args.log)
+
+        with contextlib.closing(feature_batches):
+            # Archives arrive player by player, so each group holds all the feature batches of one player.
+            for username, batches in itertools.groupby(feature_batches, key=lambda item: item[0]):
+                feature_store.clear(username)
+                for _, df_batch in batches:
+                    feature_store.append(username, df_batch)
+                print(f"{username}: Features were successfully generated! Feature cache: {feature_cache.stats()}")
+
+    print(f"Archive cache: {archive_cache.stats()}")
+
+
+def load_corpus(args):
+    """
+    Indexes the stored games of the players, balances the classes and tensorizes the balanced games.
+    Returns the feature names, (X, lengths, y) and the train, validation and test rows, which are the
+    same for every command run on the same store.
+    """
+    import numpy as np
+    from sklearn.model_selection import train_test_split
+
+    from model.feature_store import FeatureStore
+    from model.preparation import feature_names, playable_games
+    from model.tensorize import tensorize
+
+    feature_store = FeatureStore()
+    stored_players = []
     all_games = []
+    all_labels = []
+    for username in args.players:
+        # Games are referenced by (player, game) indices until they are tensorized
+        with stage('index', log=args.log, player=username):
+            arrays = feature_store.load_arrays(username)
+            games = playable_games(arrays)
+            features = feature_names(arrays)
+        print(f"{username}: {len(games)} games were indexed for training!")
+
+        all_games.append(np.column_stack([np.full(len(games), len(stored_players)), games]))
+        all_labels.append(np.full(len(games), 1 if username == args.player else 0))
+        stored_players.append(username)
+
+    games = np.concatenate(all_games)
+    y = np.concatenate(all_labels)
+
+    # Balance the classes by sampling as many games of the other players as the analyzed player has
+    rng = np.random.default_rng(42)
+    analyzed_player_games = np.flatnonzero(y == 1)
+    other_player_games = np.flatnonzero(y == 0)
 
-    for username in players:
-        filename = f'data/{username}_games.csv'
-
-        print(f"{username}: Fetching games...")
-        if username == analyzed_player:
-            history = fetch_games(username, num_months=6)
-        else:
-            history = fetch_games(username)
-        print(f"{username}: Games were successfully received!")
-
-        print(f"{username}: Starting preprocessing games...")
-        games = preprocess_games(history, game_type, username)
-        print(f"{username}: Games were successfully preprocessed!")
-
-        print(f"{username}: Starting generating features...")
-        df_games = generate_features(games)
-        df_games.to_csv(filename, index=False)
-        print(f"{username}: Features were successfully generated!")
-        
-        print(f"{username}: Starting preparing data for training...")
-        df_games = prepare_data(df_games)
-        print(f"{username}: Data was successfully generated!")
-
-        df_games['Label'] = 1 if username == analyzed_player else 0
-        all_games.append(df_games)
-
-    combined_data = pd.concat(all_games, ignore_index=True)
-    combined_data = combined_data.sample(frac=1).reset_index(drop=True)
-
-    analyzed_player_games = combined_data[combined_data['Label'] == 1]
-    other_player_games = combined_data[combined_data['Label'] == 0]
-    
     min_games = min(len(analyzed_player_games), len(other_player_games))
-    balanced_analyzed_games = analyzed_player_games.sample(n=min_games, random_state=42)
-    balanced_other_games = other_player_games.sample(n=min_games, random_state=42)
-    
-    balanced_data = pd.concat([balanced_analyzed_games, balanced_other_games], ignore_index=True)
-    balanced_data = balanced_data.sample(frac=1).reset_index(drop=True)
-
-    train_data, test_data = train_test_split(balanced_data, test_size=0.2, random_state=42)
-
-    print(f"{analyzed_player}: Starting training the data...")
-    model = train_model(train_data)
-    model.save(f'data/{analyzed_player}_model.keras')
-    evaluate_model(model, test_data)
-    print(f"{analyzed_player}: Model training complete and saved!")
+    balanced_games = np.concatenate([rng.choice(analyzed_player_games, min_games, replace=False),
+                                     rng.choice(other_player_games, min_games, replace=False)])
+    rng.shuffle(balanced_games)
+
+    # The balanced games are tensorized once, training, validation and evaluation read rows of the same tensor
+    with stage('tensorize', log=args.log, player=args.player):
+        X, lengths, y = tensorize(feature_store, stored_players, games[balanced_games], y[balanced_games])
+    train_games, test_games = train_test_split(np.arange(len(y)), test_size=0.2, random_state=42)
+    train_games, validation_games = train_test_split(train_games, test_size=0.2, random_state=42)
+    return features, (X, lengths, y), (train_games, validation_games, test_games)
+
+
+def train(args):
+    """ Trains the model of the analyzed player on the stored features and saves it with its scalers """
+    from model.datasets import make_dataset
+    from model.numpy_runtime import export_model
+    from model.scalers import scalers_path
+    from model.tensorize import fit_scalers
+    from model.training import train_model
+
+    features, (X, lengths, y), (train_games, validation_games, _) = load_corpus(args)
+
+    # Scalers are fitted once, on the training games only, and saved along with the model
+    path = model_path(args)
+    with stage('fit_scalers', log=args.log, player=args.player):
+        scalers = fit_scalers(features, X, lengths, train_games)
+        scalers.save(scalers_path(path))
+
+    # Datasets read the memory-mapped corpus every epoch rather than caching it, so it never has to fit in memory
+    train_dataset = make_dataset(X, lengths, y, scalers, train_games, batch_size=args.batch_size, shuffle=True)
+    validation_dataset = make_dataset(X, lengths, y, scalers, validation_games, batch_size=args.batch_size)
+
+    print(f"{args.player}: Starting training the data...")
+    with stage('train', log=args.log, player=args.player):
+        model = train_model(train_dataset, validation_dataset, epochs=args.epochs, patience=args.patience)
+        model.save(path)
+        export_model(path)
+    print(f"{args.player}: Model training complete and saved!")
+    return model
+
+
+def evaluate(args, model=None):
+    """ Evaluates the saved model of the analyzed player on the test games """
+    from model.datasets import make_dataset
+    from model.evaluation import evaluate_model
+    from model.scalers import FeatureScalers, scalers_path
+
+    _, (X, lengths, y), (_, _, test_games) = load_corpus(args)
+    path = model_path(args)
+    if model is None:
+        import tensorflow as tf
+
+        model = tf.keras.models.load_model(path)
+    scalers = FeatureScalers.load(scalers_path(path))
+    with stage('evaluate', log=args.log, player=args.player):
+        evaluate_model(model, make_dataset(X, lengths, y, scalers, test_games), y[test_games])
+
+
+def score(args):
+    """ Prints the probability that the player of a PGN file is the analyzed player """
+    from model.scoring import GameScorer
+
+    try:
+        scorer = GameScorer(model_path(args), game_type=args.game_type, runtime=args.runtime)
+        with open(args.pgn, encoding='utf-8') as file:
+            pgn = file.read()
+    except FileNotFoundError as error:
+        raise SystemExit(str(error))
+    print(scorer.score(pgn, args.username or args.player))
+
+
+def run(args):
+    """ Featurizes, trains and evaluates, the whole pipeline """
+    featurize(args)
+    evaluate(args, train(args))
+
+
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--player', default=ANALYZED_PLAYER, help='The analyzed player')
+    common.add_argument('--players', nargs='+', default=PLAYERS, help='All the players, analyzed one included')
+    common.add_argument('--game-type', default=GAME_TYPE)
+    common.add_argument('--model', help='Model path, data/{player}_model.keras by default')
+    common.add_argument('--metrics-log', help='JSON lines file the stage and feature metrics are appended to')
+    common.add_argument('--metrics-prometheus', help='File the metrics are written to in the Prometheus text format')
+
+    feature_options = argparse.ArgumentParser(add_help=False)
+    feature_options.add_argument('--features', nargs='+',
+                                 help='Metric names or metric groups to compute (see model.feature_sets), all by default')
+    feature_options.add_argument('--workers', type=int, help='Feature worker processes, all CPUs by default')
+    feature_options.add_argument('--chunk-size', type=int,
+                                 help='Positions per feature worker task, chosen from the input size by default')
+
+    parser = argparse.ArgumentParser(description='Chess.com player identification from game features.')
+    # Without a subcommand the whole pipeline runs with the default options, as it always did
+    parser.set_defaults(func=run, **vars(common.parse_args([])), **vars(feature_options.parse_args([])), epochs=50,
+                        patience=5, batch_size=32)
+    commands = parser.add_subparsers(dest='command')
+
+    for name, func, parents in (('fetch', fetch, [common]), ('featurize', featurize, [common, feature_options]),
+                                ('evaluate', evaluate, [common])):
+        commands.add_parser(name, parents=parents, help=func.__doc__).set_defaults(func=func)
+    for name, func, parents in (('train', train, [common]), ('run', run, [common, feature_options])):
+        command = commands.add_parser(name, parents=parents, help=func.__doc__)
+        command.add_argument('--epochs', type=int, default=50)
+        command.add_argument('--patience', type=int, default=5, help='Epochs without validation improvement')
+        command.add_argument('--batch-size', type=int, default=32, help='Games per training batch')
+        command.set_defaults(func=func)
+    command = commands.add_parser('score', parents=[common], help=score.__doc__)
+    command.add_argument('pgn', help='PGN file of the game')
+    command.add_argument('--username', help='Player of the game to score, the analyzed player by default')
+    command.add_argument('--runtime', choices=['tensorflow', 'numpy'], default='numpy')
+    command.set_defaults(func=score)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.log = open(args.metrics_log, 'a', encoding='utf-8') if args.metrics_log else None
+    try:
+        args.func(args)
+    finally:
+        if args.log is not None:
+            args.log.write(json.dumps({'time': time.time(), 'command': args.command or 'run',
+                                       'positions_per_second': positions_per_second(),
+                                       'metrics': METRICS.records()}) + '\n')
+            args.log.close()
+        if args.metrics_prometheus:
+            with open(args.metrics_prometheus, 'w', encoding='utf-8') as file:
+                file.write(METRICS.to_prometheus())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+import time
+
+import chess
+import numpy as np
+
+from model.bitboard_features import (METRIC_NAMES, BB_ADJACENT_FILES, BB_ADVANCED, BB_HOME_SQUARES, PIECE_VALUES,
+                                     compute_metrics, split_metrics)
+from model.instrumentation import METRICS, metric_key
+
+# Batched feature computation: N positions are packed into a (N, 12) uint64 array of piece
+# bitboards, ordered white pawn..king then black pawn..king, and the placement-only metrics
+# are evaluated as NumPy operations over the whole batch.
+
+FILE_MASKS = np.array(chess.BB_FILES, dtype=np.uint64)
+ADJACENT_FILE_MASKS = np.array(BB_ADJACENT_FILES, dtype=np.uint64)
+KING_ATTACK_MASKS = np.array(chess.BB_KING_ATTACKS, dtype=np.uint64)
+ADVANCED_MASKS = np.array([BB_ADVANCED[chess.BLACK], BB_ADVANCED[chess.WHITE]], dtype=np.uint64)
+HOME_MASKS = np.array([[home for _, home in BB_HOME_SQUARES[chess.BLACK]],
+                       [home for _, home in BB_HOME_SQUARES[chess.WHITE]]], dtype=np.uint64)
+MATERIAL_VALUES = np.array(PIECE_VALUES[1:], dtype=np.int64)
+
+
+def popcount64(bitboards):
+    """
+    Counts the set bits of every element of a uint64 array.
+    """
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(bitboards).astype(np.int64)
+    x = bitboards - ((bitboards >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return ((x * np.uint64(0x0101010101010101)) >> np.uint64(56)).astype(np.int64)
+
+
+def pack_boards(boards):
+    """
+    Packs boards into a (N, 12) uint64 array of piece bitboards.
+    """
+    planes = np.zeros((len(boards), 12), dtype=np.uint64)
+    for row, board in zip(planes, boards):
+        black, white = board.occupied_co
+        row[:] = (board.pawns & white, board.knights & white, board.bishops & white,
+                  board.rooks & white, board.queens & white, board.kings & white,
+                  board.pawns & black, board.knights & black, board.bishops & black,
+                  board.rooks & black, board.queens & black, board.kings & black)
+    return planes
+
+
+def compute_static_metrics_batch(planes, colors):
+    """
+    Computes STATIC_METRICS for a batch of positions. *colors* is a boolean array holding the
+    color of the player who just moved in each position, True for white.
+
+    Returns a dict of int64 arrays of length N keyed by metric name.
+    """
+    colors = np.asarray(colors, dtype=bool)
+    white, black = planes[:, :6], planes[:, 6:]
+    own = np.where(colors[:, None], white, black)
+    enemy = np.where(colors[:, None], black, white)
+    own_pawns = own[:, 0]
+
+    # King shelter
+    king_squares = popcount64(own[:, 5] - np.uint64(1))
+    pawn_shield = popcount64(own_pawns & KING_ATTACK_MASKS[king_squares])
+    king_files = king_squares & 7
+    open_files = np.zeros(len(planes), dtype=np.int64)
+    for offset in (-1, 0, 1):
+        files = king_files + offset
+        on_board = (files >= 0) & (files <= 7)
+        empty = (own_pawns & FILE_MASKS[np.clip(files, 0, 7)]) == 0
+        open_files += on_board & empty
+
+    # Development
+    advanced_pawns = popcount64(own_pawns & ADVANCED_MASKS[colors.astype(np.int64)])
+    any_color = white | black
+    developed_pieces = popcount64(HOME_MASKS[colors.astype(np.int64)] & ~any_color).sum(axis=1)
+
+    # Material
+    total_material = (popcount64(own) - popcount64(enemy)) @ MATERIAL_VALUES
+
+    # Pawn structure
+    file_counts = popcount64(own_pawns[:, None] & FILE_MASKS[None, :])
+    adjacent_empty = (own_pawns[:, None] & ADJACENT_FILE_MASKS[None, :]) == 0
+    doubled_pawns = (file_counts * (file_counts > 1)).sum(axis=1)
+    isolated_pawns = (file_counts * adjacent_empty).sum(axis=1)
+
+    # A pawn is passed when no enemy piece stands in front of it on its file.
+    enemy_occupied = np.bitwise_or.reduce(enemy, axis=1)
+    south, north = enemy_occupied.copy(), enemy_occupied.copy()
+    for shift in (8, 16, 32):
+        south |= south >> np.uint64(shift)
+        north |= north << np.uint64(shift)
+    blocked = np.where(colors, south >> np.uint64(8), north << np.uint64(8))
+    passed_pawns = popcount64(own_pawns & ~blocked)
+
+    return {
+        'Pawn Shield': pawn_shield,
+        'Open Files': open_files,
+        'Advanced Pawns': advanced_pawns,
+        'Developed Pieces': developed_pieces,
+        'Total Material': total_material,
+        'Doubled Pawns': doubled_pawns,
+        'Isolated Pawns': isolated_pawns,
+        'Passed Pawns': passed_pawns
+    }
+
+
+def evaluate_fens_batch(fens, metrics=METRIC_NAMES):
+    """
+    Evaluates a list of FENs and returns a (N, len(metrics)) float32 array whose columns follow
+    *metrics*, a tuple of metric names. Placement-only metrics are vectorized over the batch, the
+    attack based ones come from the bitboard engine, which only computes those of *metrics*.
+    """
+    boards = [chess.Board(fen) for fen in fens]
+    colors = np.array([not board.turn for board in boards], dtype=bool)
+    metrics_matrix = np.zeros((len(boards), len(metrics)), dtype=np.float32)
+    if not boards:
+        return metrics_matrix
+
+    columns = {name: i for i, name in enumerate(metrics)}
+    attack_metrics, static_metrics = split_metrics(metrics)
+    if static_metrics:
+        start = time.perf_counter()
+        static = compute_static_metrics_batch(pack_boards(boards), colors)
+        for name in static_metrics:
+            metrics_matrix[:, columns[name]] = static[name]
+        METRICS.lap(start, metric_key('metric_group_seconds', group='static_batch'))
+
+    if attack_metrics:
+        attack_columns = [columns[name] for name in attack_metrics]
+        for row, board, color in zip(metrics_matrix, boards, colors):
+            attack = compute_metrics(board, bool(color), attack_metrics)
+            row[attack_columns] = [attack[name] for name in attack_metrics]
+
+    return metrics_matrix
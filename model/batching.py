@@ -0,0 +1,99 @@
+import asyncio
+import collections
+import time
+
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent inference requests into batches for a single forward pass.
+
+    Requests are (1, moves, features) padded tensors queued by submit(). A batch is run as soon as it
+    holds *max_batch_size* requests or its first request has waited *max_wait* seconds, and every
+    request gets its own row of the result. *predict* maps a (batch, moves, features) tensor to a
+    vector of probabilities and runs in a worker thread so the event loop keeps accepting requests.
+    """
+
+    def __init__(self, predict, max_batch_size=32, max_wait=0.005, latency_window=10000):
+        self.predict = predict
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue()
+        self.requests = 0
+        self.batches = 0
+        self.started = time.perf_counter()
+        self.latencies = collections.deque(maxlen=latency_window)
+        self._task = None
+
+    async def start(self):
+        self.started = time.perf_counter()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def submit(self, X):
+        """
+        Queues a (1, moves, features) tensor and returns its probability once its batch has run.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((X, future, time.perf_counter()))
+        return await future
+
+    async def _next_batch(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                probabilities = await asyncio.to_thread(self.predict, np.concatenate([X for X, _, _ in batch]))
+            except Exception as error:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+
+            finished = time.perf_counter()
+            self.requests += len(batch)
+            self.batches += 1
+            for (_, future, queued), probability in zip(batch, probabilities):
+                self.latencies.append(finished - queued)
+                if not future.done():
+                    future.set_result(float(probability))
+
+    def metrics(self):
+        """
+        Returns the request and batch counts, the throughput since start and the p50/p99 latencies in
+        milliseconds from queueing to result.
+        """
+        latencies = np.array(self.latencies) * 1000
+        elapsed = time.perf_counter() - self.started
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'mean_batch_size': self.requests / self.batches if self.batches else 0.0,
+            'throughput_per_s': self.requests / elapsed if elapsed else 0.0,
+            'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+            'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000
+        }
@@ -0,0 +1,623 @@
+import functools
+import itertools
+import time
+
+import chess
+
+from model.instrumentation import METRICS, metric_key
+
+# Integer bitboard implementation of the metrics in model/features.py. Every
+# function takes the perspective colour explicitly (the player who just moved)
+# and works on the board's piece bitboards, so the board is never mutated and
+# no legal move list is materialised.
+
+METRIC_NAMES = (
+    'Attacker Score', 'Defender Score', 'Pawn Shield', 'Open Files',
+    'Mobility', 'Control of Center', 'Advanced Pawns', 'Developed Pieces', 'Space Control',
+    'Total Material',
+    'Doubled Pawns', 'Isolated Pawns', 'Passed Pawns', 'Piece Coordination',
+    'Forks', 'Pins', 'Skewers', 'Threats'
+)
+# Metrics that only depend on piece placement, without attacks or move generation.
+STATIC_METRICS = (
+    'Pawn Shield', 'Open Files', 'Advanced Pawns', 'Developed Pieces', 'Total Material',
+    'Doubled Pawns', 'Isolated Pawns', 'Passed Pawns'
+)
+ATTACK_METRICS = tuple(name for name in METRIC_NAMES if name not in STATIC_METRICS)
+
+PIECE_VALUES = (0, 1, 3, 3, 5, 9, 0)  # indexed by chess piece type, king is worth nothing
+SKEWER_VALUES = (0, 1, 3, 3, 5, 9, 100)
+
+BB_FILES = chess.BB_FILES
+BB_ADJACENT_FILES = [(BB_FILES[f - 1] if f > 0 else 0) | (BB_FILES[f + 1] if f < 7 else 0) for f in range(8)]
+BB_CENTER = chess.BB_E4 | chess.BB_D4 | chess.BB_E5 | chess.BB_D5
+BB_ADVANCED = {
+    chess.WHITE: chess.BB_RANK_5 | chess.BB_RANK_6 | chess.BB_RANK_7 | chess.BB_RANK_8,
+    chess.BLACK: chess.BB_RANK_1 | chess.BB_RANK_2 | chess.BB_RANK_3 | chess.BB_RANK_4,
+}
+BB_BACKRANKS = chess.BB_RANK_1 | chess.BB_RANK_8
+BB_HOME_SQUARES = {
+    chess.WHITE: (
+        (chess.PAWN, chess.BB_RANK_2),
+        (chess.KNIGHT, chess.BB_B1 | chess.BB_G1),
+        (chess.BISHOP, chess.BB_C1 | chess.BB_F1),
+        (chess.ROOK, chess.BB_A1 | chess.BB_H1),
+        (chess.QUEEN, chess.BB_D1),
+        (chess.KING, chess.BB_E1),
+    ),
+    chess.BLACK: (
+        (chess.PAWN, chess.BB_RANK_7),
+        (chess.KNIGHT, chess.BB_B8 | chess.BB_G8),
+        (chess.BISHOP, chess.BB_C8 | chess.BB_F8),
+        (chess.ROOK, chess.BB_A8 | chess.BB_H8),
+        (chess.QUEEN, chess.BB_D8),
+        (chess.KING, chess.BB_E8),
+    ),
+}
+
+# is_potential_skewer walks raw square offsets, so a ray in direction d from a
+# square visits every later square of the same residue class modulo d.
+SKEWER_STEPS = (1, 7, 8, 9)
+
+BB_KNIGHT_ATTACKS = chess.BB_KNIGHT_ATTACKS
+BB_KING_ATTACKS = chess.BB_KING_ATTACKS
+BB_PAWN_ATTACKS = chess.BB_PAWN_ATTACKS
+BB_RANK_ATTACKS, BB_RANK_MASKS = chess.BB_RANK_ATTACKS, chess.BB_RANK_MASKS
+BB_FILE_ATTACKS, BB_FILE_MASKS = chess.BB_FILE_ATTACKS, chess.BB_FILE_MASKS
+BB_DIAG_ATTACKS, BB_DIAG_MASKS = chess.BB_DIAG_ATTACKS, chess.BB_DIAG_MASKS
+BB_RAYS = chess.BB_RAYS
+BB_SQUARES = chess.BB_SQUARES
+
+
+try:
+    popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+    def popcount(bb):
+        return bin(bb).count('1')
+
+
+# Squares of every possible byte of a bitboard, one table per rank.
+RANK_BYTE_SQUARES = [[tuple(rank * 8 + i for i in range(8) if byte >> i & 1) for byte in range(256)]
+                     for rank in range(8)]
+
+
+def iter_squares(bb):
+    """
+    Returns the squares of a bitboard from a1 to h8, one rank at a time.
+    """
+    squares = []
+    for byte_squares in RANK_BYTE_SQUARES:
+        if not bb:
+            break
+        byte = bb & 255
+        if byte:
+            squares += byte_squares[byte]
+        bb >>= 8
+    return squares
+
+
+def king_square(board, color):
+    king_mask = board.kings & board.occupied_co[color]
+    return king_mask.bit_length() - 1 if king_mask else None
+
+
+def piece_attacks(board, piece_type, square, color, occupied):
+    """
+    Returns the attack mask of a piece of the given type standing on the square.
+    """
+    if piece_type == chess.PAWN:
+        return BB_PAWN_ATTACKS[color][square]
+    if piece_type == chess.KNIGHT:
+        return BB_KNIGHT_ATTACKS[square]
+    if piece_type == chess.KING:
+        return BB_KING_ATTACKS[square]
+    attacks = 0
+    if piece_type != chess.ROOK:
+        attacks = BB_DIAG_ATTACKS[square][BB_DIAG_MASKS[square] & occupied]
+    if piece_type != chess.BISHOP:
+        attacks |= (BB_RANK_ATTACKS[square][BB_RANK_MASKS[square] & occupied] |
+                    BB_FILE_ATTACKS[square][BB_FILE_MASKS[square] & occupied])
+    return attacks
+
+
+def attackers_mask(board, color, square, occupied):
+    """
+    Same as chess.BaseBoard.attackers_mask but with an explicit occupancy.
+    """
+    queens_and_rooks = board.queens | board.rooks
+    queens_and_bishops = board.queens | board.bishops
+    attackers = (
+        (BB_KING_ATTACKS[square] & board.kings) |
+        (BB_KNIGHT_ATTACKS[square] & board.knights) |
+        (BB_RANK_ATTACKS[square][BB_RANK_MASKS[square] & occupied] & queens_and_rooks) |
+        (BB_FILE_ATTACKS[square][BB_FILE_MASKS[square] & occupied] & queens_and_rooks) |
+        (BB_DIAG_ATTACKS[square][BB_DIAG_MASKS[square] & occupied] & queens_and_bishops) |
+        (BB_PAWN_ATTACKS[not color][square] & board.pawns))
+    return attackers & board.occupied_co[color]
+
+
+def slider_blockers(board, color, king):
+    """
+    Returns every piece, of either colour, that is the only piece standing between the king of the
+    given color and an enemy slider.
+    """
+    rooks_and_queens = board.rooks | board.queens
+    bishops_and_queens = board.bishops | board.queens
+    snipers = ((BB_RANK_ATTACKS[king][0] & rooks_and_queens) |
+               (BB_FILE_ATTACKS[king][0] & rooks_and_queens) |
+               (BB_DIAG_ATTACKS[king][0] & bishops_and_queens)) & board.occupied_co[not color]
+
+    blockers = 0
+    for sniper in iter_squares(snipers):
+        b = chess.between(king, sniper) & board.occupied
+        if b and not b & (b - 1):
+            blockers |= b
+    return blockers
+
+
+def pieces_by_type(board):
+    return ((chess.PAWN, board.pawns), (chess.KNIGHT, board.knights), (chess.BISHOP, board.bishops),
+            (chess.ROOK, board.rooks), (chess.QUEEN, board.queens), (chess.KING, board.kings))
+
+
+# KING SAFETY FEATURES
+def compute_king_zone_metrics(board, color, attacks):
+    """
+    Computes the weighted attacks of the given color on the squares around both kings.
+    *attacks* is the list of (piece_type, square, mask) of that color.
+    """
+    enemy_zone = BB_KING_ATTACKS[king_square(board, not color)]
+    own_zone = BB_KING_ATTACKS[king_square(board, color)]
+
+    attacker_score = 0
+    defender_score = 0
+    for piece_type, _, mask in attacks:
+        value = PIECE_VALUES[piece_type]
+        if value:
+            attacker_score += value * popcount(mask & enemy_zone)
+            defender_score += value * popcount(mask & own_zone)
+
+    return {
+        'Attacker Score': attacker_score,
+        'Defender Score': defender_score
+    }
+
+
+def compute_king_shelter_metrics(board, color):
+    """
+    Computes the pawn shield and the open files around the king of the given color.
+    """
+    own_king = king_square(board, color)
+    own_pawns = board.pawns & board.occupied_co[color]
+    king_file = own_king & 7
+    open_files = 0
+    for file in range(max(king_file - 1, 0), min(king_file + 1, 7) + 1):
+        if not own_pawns & BB_FILES[file]:
+            open_files += 1
+
+    return {
+        'Pawn Shield': popcount(own_pawns & BB_KING_ATTACKS[own_king]),
+        'Open Files': open_files
+    }
+
+
+# PIECE ACTIVITY FEATURES
+def compute_piece_activity_metrics(board, color, attacks):
+    """
+    Computes control of the center and space control of the given color.
+    """
+    own = board.occupied_co[color]
+
+    control_of_center = 0
+    space = 0
+    for piece_type, _, mask in attacks:
+        control_of_center += PIECE_VALUES[piece_type] * popcount(mask & BB_CENTER)
+        space |= mask
+    for piece_type, bb in pieces_by_type(board):
+        control_of_center += PIECE_VALUES[piece_type] * popcount(bb & own & BB_CENTER)
+
+    return {
+        'Control of Center': control_of_center,
+        'Space Control': popcount(space)
+    }
+
+
+def compute_development_metrics(board, color):
+    """
+    Counts advanced pawns and developed pieces of the given color.
+    """
+    return {
+        'Advanced Pawns': popcount(board.pawns & board.occupied_co[color] & BB_ADVANCED[color]),
+        'Developed Pieces': calculate_developed_pieces(board, color)
+    }
+
+
+def calculate_developed_pieces(board, color):
+    """
+    Counts the initial squares of the given color that no longer hold a piece of their original type.
+    """
+    developed_pieces = 0
+    for (piece_type, home), (_, bb) in zip(BB_HOME_SQUARES[color], pieces_by_type(board)):
+        developed_pieces += popcount(home & ~bb)
+    return developed_pieces
+
+
+def compute_material_balance_metrics(board, color):
+    """
+    Calculates the material difference from the perspective of the given color.
+    """
+    own = board.occupied_co[color]
+    enemy = board.occupied_co[not color]
+    total_material = 0
+    for piece_type, bb in pieces_by_type(board):
+        total_material += PIECE_VALUES[piece_type] * (popcount(bb & own) - popcount(bb & enemy))
+    return {
+        'Total Material': total_material,
+    }
+
+
+# POSITIONAL FEATURES
+def compute_pawn_structure_metrics(board, color):
+    """
+    Counts doubled, isolated and passed pawns with file masks.
+    """
+    pawns = board.pawns & board.occupied_co[color]
+    doubled_pawns, isolated_pawns = count_doubled_and_isolated_pawns(pawns)
+    return {
+        'Doubled Pawns': doubled_pawns,
+        'Isolated Pawns': isolated_pawns,
+        'Passed Pawns': count_passed_pawns(pawns, board.occupied_co[not color], color)
+    }
+
+
+def count_doubled_and_isolated_pawns(pawns):
+    """
+    Returns the number of pawns sharing their file and of pawns without pawns on the adjacent files.
+    """
+    doubled_pawns = 0
+    isolated_pawns = 0
+    for file in range(8):
+        file_pawns = pawns & BB_FILES[file]
+        if file_pawns:
+            count = popcount(file_pawns)
+            if count > 1:
+                doubled_pawns += count
+            if not pawns & BB_ADJACENT_FILES[file]:
+                isolated_pawns += count
+    return doubled_pawns, isolated_pawns
+
+
+def count_passed_pawns(pawns, enemy, color):
+    """
+    Counts the pawns of the given color with no enemy piece in front of them on their file.
+    """
+    # Squares behind an enemy piece (from the pawn's point of view) are exactly those whose front span is blocked.
+    if color == chess.WHITE:
+        enemy |= enemy >> 8
+        enemy |= enemy >> 16
+        enemy |= enemy >> 32
+        blocked = enemy >> 8
+    else:
+        enemy |= enemy << 8
+        enemy |= enemy << 16
+        enemy |= enemy << 32
+        blocked = (enemy << 8) & chess.BB_ALL
+    return popcount(pawns & ~blocked)
+
+
+def compute_piece_coordination_metrics(board, color, attacks):
+    """
+    Counts how many times pieces of the given color defend each other.
+    """
+    own = board.occupied_co[color]
+    return {'Piece Coordination': sum(popcount(mask & own) for _, _, mask in attacks)}
+
+
+# TACTICAL FEATURES
+def generate_piece_targets(board, color, king, blockers, evasions=chess.BB_ALL):
+    """
+    Returns (piece_type, square, targets, promotions) for every non-king piece of the given color that has
+    legal destinations. Pinned pieces stay on their pin ray and *evasions* restricts the destinations when
+    the king is in check by a single piece. En passant is not included.
+    """
+    own = board.occupied_co[color]
+    enemy = board.occupied_co[not color]
+    occupied = board.occupied
+    pinned = blockers & own
+
+    piece_targets = []
+    for piece_type, bb in pieces_by_type(board):
+        if piece_type == chess.KING:
+            continue
+        for square in iter_squares(bb & own):
+            if piece_type == chess.PAWN:
+                targets = BB_PAWN_ATTACKS[color][square] & enemy
+                if color == chess.WHITE:
+                    push = BB_SQUARES[square] << 8 & ~occupied
+                    if push and square < 16:
+                        push |= push << 8 & ~occupied
+                else:
+                    push = BB_SQUARES[square] >> 8 & ~occupied
+                    if push and square >= 48:
+                        push |= push >> 8 & ~occupied
+                targets |= push
+            else:
+                targets = piece_attacks(board, piece_type, square, color, occupied) & ~own
+            targets &= evasions
+            if BB_SQUARES[square] & pinned:
+                targets &= BB_RAYS[king][square]
+            if targets:
+                promotions = targets & BB_BACKRANKS if piece_type == chess.PAWN else 0
+                piece_targets.append((piece_type, square, targets, promotions))
+    return piece_targets
+
+
+def count_fork_moves(board, color, piece_targets):
+    """
+    Counts the moves after which the moved piece is attacked by two or more enemy pieces, at least one of
+    them a bishop, rook, queen or king, as compute_forks does. The attackers of each destination are looked
+    up from attack tables with the occupancy the move leaves behind instead of playing the move.
+    """
+    enemy = board.occupied_co[not color]
+    occupied = board.occupied
+    enemy_king = board.kings & enemy
+    enemy_knights = board.knights & enemy
+    enemy_pawns = board.pawns & enemy
+    enemy_orthogonal = (board.rooks | board.queens) & enemy
+    enemy_diagonal = (board.bishops | board.queens) & enemy
+    high_value = board.bishops | board.rooks | board.queens | board.kings
+    pawn_attacks = BB_PAWN_ATTACKS[color]
+
+    forks = 0
+    for _, square, targets, promotions in piece_targets:
+        vacated = occupied & ~BB_SQUARES[square]
+        for to_square in iter_squares(targets):
+            after = vacated | BB_SQUARES[to_square]
+            attackers = (
+                (BB_KING_ATTACKS[to_square] & enemy_king) |
+                (BB_KNIGHT_ATTACKS[to_square] & enemy_knights) |
+                (pawn_attacks[to_square] & enemy_pawns) |
+                ((BB_RANK_ATTACKS[to_square][BB_RANK_MASKS[to_square] & after] |
+                  BB_FILE_ATTACKS[to_square][BB_FILE_MASKS[to_square] & after]) & enemy_orthogonal) |
+                (BB_DIAG_ATTACKS[to_square][BB_DIAG_MASKS[to_square] & after] & enemy_diagonal))
+            if attackers & (attackers - 1) and attackers & high_value:
+                # Each of the four promotions is a separate move.
+                forks += 4 if BB_SQUARES[to_square] & promotions else 1
+    return forks
+
+
+def count_forks(board, color):
+    """
+    Counts forks for the given color on any legal position without mutating the board. King moves and
+    castling always land on unattacked squares, so only piece moves and en passant captures can fork.
+    """
+    king = king_square(board, color)
+    checkers = attackers_mask(board, not color, king, board.occupied)
+    if checkers & (checkers - 1):
+        return 0
+    evasions = chess.between(king, checkers.bit_length() - 1) | checkers if checkers else chess.BB_ALL
+
+    blockers = slider_blockers(board, color, king)
+    forks = count_fork_moves(board, color, generate_piece_targets(board, color, king, blockers, evasions))
+
+    if board.ep_square is not None and board.turn == color:
+        high_value = board.bishops | board.rooks | board.queens | board.kings
+        for move in board.generate_legal_ep():
+            captured = move.to_square + (-8 if color == chess.WHITE else 8)
+            after = (board.occupied & ~BB_SQUARES[move.from_square] & ~BB_SQUARES[captured]) | BB_SQUARES[move.to_square]
+            attackers = attackers_mask(board, not color, move.to_square, after)
+            if attackers & (attackers - 1) and attackers & high_value:
+                forks += 1
+    return forks
+
+
+def compute_mobility_metrics(board, color, piece_targets):
+    """
+    Computes mobility and threats from the legal non-king moves of the given color, as returned by
+    generate_piece_targets.
+
+    The color is assumed not to be in check, which holds for the player who just moved. King moves and
+    castling are worth nothing for mobility and never add threats beyond king captures, which are handled
+    separately. En passant is never available to the player who just moved.
+    """
+    enemy = board.occupied_co[not color]
+    mobility = 0
+    threats = 0
+    for piece_type, _, targets, promotions in piece_targets:
+        mobility += PIECE_VALUES[piece_type] * (popcount(targets) + 3 * popcount(promotions))
+        threats += popcount(targets & enemy) + 3 * popcount(promotions & enemy)
+
+    for to_square in iter_squares(BB_KING_ATTACKS[king_square(board, color)] & enemy):
+        if not attackers_mask(board, not color, to_square, board.occupied):
+            threats += 1
+
+    return {
+        'Mobility': mobility,
+        'Threats': threats
+    }
+
+
+def compute_fork_metrics(board, color, piece_targets):
+    """
+    Counts forks from the legal non-king moves of the given color, king moves and castling always
+    landing on unattacked squares.
+    """
+    return {'Forks': count_fork_moves(board, color, piece_targets)}
+
+
+def count_skewers(board):
+    """
+    Mirrors is_potential_skewer for every occupied square: along each direction the second piece met must
+    share the origin's color and be worth more than the first.
+    """
+    values = [0] * 64
+    for piece_type, bb in pieces_by_type(board):
+        value = SKEWER_VALUES[piece_type]
+        for square in iter_squares(bb):
+            values[square] = value
+    white = board.occupied_co[chess.WHITE]
+    pieces = [(square, values[square], bool(BB_SQUARES[square] & white)) for square in iter_squares(board.occupied)]
+
+    skewered = set()
+    for step in SKEWER_STEPS:
+        chains = [[] for _ in range(step)]
+        for piece in pieces:
+            chains[piece[0] % step].append(piece)
+        for chain in chains:
+            for near, first, second in zip(chain, chain[1:], chain[2:]):
+                if second[1] > first[1] and second[2] == near[2]:
+                    skewered.add(near[0])
+                if near[1] > first[1] and near[2] == second[2]:
+                    skewered.add(second[0])
+    return len(skewered)
+
+
+def compute_attack_maps(board, color):
+    """
+    Returns (piece_type, square, attack mask) for every piece of the given color.
+    """
+    occupied = board.occupied
+    attacks = []
+    for piece_type, bb in pieces_by_type(board):
+        for square in iter_squares(bb & board.occupied_co[color]):
+            attacks.append((piece_type, square, piece_attacks(board, piece_type, square, color, occupied)))
+    return attacks
+
+
+def compute_king_blockers(board, color):
+    return slider_blockers(board, color, king_square(board, color))
+
+
+def compute_piece_targets(board, color, blockers):
+    return generate_piece_targets(board, color, king_square(board, color), blockers)
+
+
+def compute_pin_metrics(board, color, blockers):
+    return {'Pins': popcount(blockers)}
+
+
+def compute_skewer_metrics(board, color):
+    return {'Skewers': count_skewers(board)}
+
+
+# Computation graph of the metrics: node -> (function, input nodes). Functions are called with the board,
+# the color and the values of their input nodes, in order. Metric nodes return {metric name: value}, the
+# other nodes are intermediates computed once per position and shared by every node that reads them.
+METRIC_GRAPH = {
+    'attack_maps': (compute_attack_maps, ()),
+    'blockers': (compute_king_blockers, ()),
+    'piece_targets': (compute_piece_targets, ('blockers',)),
+    'king_zone': (compute_king_zone_metrics, ('attack_maps',)),
+    'activity': (compute_piece_activity_metrics, ('attack_maps',)),
+    'coordination': (compute_piece_coordination_metrics, ('attack_maps',)),
+    'mobility': (compute_mobility_metrics, ('piece_targets',)),
+    'forks': (compute_fork_metrics, ('piece_targets',)),
+    'pins': (compute_pin_metrics, ('blockers',)),
+    'skewers': (compute_skewer_metrics, ()),
+    'king_shelter': (compute_king_shelter_metrics, ()),
+    'development': (compute_development_metrics, ()),
+    'material_balance': (compute_material_balance_metrics, ()),
+    'pawn_structure': (compute_pawn_structure_metrics, ()),
+}
+# Metric name -> the node of METRIC_GRAPH that computes it.
+METRIC_NODES = {
+    'Attacker Score': 'king_zone', 'Defender Score': 'king_zone',
+    'Pawn Shield': 'king_shelter', 'Open Files': 'king_shelter',
+    'Mobility': 'mobility', 'Control of Center': 'activity',
+    'Advanced Pawns': 'development', 'Developed Pieces': 'development', 'Space Control': 'activity',
+    'Total Material': 'material_balance',
+    'Doubled Pawns': 'pawn_structure', 'Isolated Pawns': 'pawn_structure', 'Passed Pawns': 'pawn_structure',
+    'Piece Coordination': 'coordination',
+    'Forks': 'forks', 'Pins': 'pins', 'Skewers': 'skewers', 'Threats': 'mobility'
+}
+
+
+@functools.lru_cache(maxsize=None)
+def evaluation_plan(metrics):
+    """
+    Returns the nodes of METRIC_GRAPH needed to compute a tuple of metric names, as (node, function, inputs,
+    is_metric, key of the node's sampled time counter) with every node after its inputs. Nodes no selected
+    metric depends on are left out.
+    """
+    plan = {}
+
+    def visit(node):
+        if node not in plan:
+            function, inputs = METRIC_GRAPH[node]
+            for input_node in inputs:
+                visit(input_node)
+            plan[node] = (function, inputs)
+
+    for name in metrics:
+        visit(METRIC_NODES[name])
+    metric_nodes = {METRIC_NODES[name] for name in metrics}
+    return tuple((node, function, inputs, node in metric_nodes, metric_key('metric_group_sampled_seconds', group=node))
+                 for node, (function, inputs) in plan.items())
+
+
+@functools.lru_cache(maxsize=None)
+def split_metrics(metrics):
+    """ Splits a tuple of metric names into its ATTACK_METRICS and its STATIC_METRICS, in order. """
+    return (tuple(name for name in metrics if name not in STATIC_METRICS),
+            tuple(name for name in metrics if name in STATIC_METRICS))
+
+
+# Timing every node of every position would cost a noticeable share of the kernel, which only takes about
+# a hundred microseconds per position. The nodes of one position in PROFILE_EVERY are timed instead, into
+# metric_group_sampled_seconds, and metric_group_sampled_positions counts the timed positions.
+PROFILE_EVERY = 32
+PROFILED_POSITIONS = itertools.cycle([True] + [False] * (PROFILE_EVERY - 1))
+SAMPLED_POSITIONS_KEY = metric_key('metric_group_sampled_positions', engine='bitboard')
+
+
+def compute_metrics(board, color, metrics=METRIC_NAMES):
+    """
+    Computes a tuple of metric names for the given color, running only the nodes of METRIC_GRAPH they
+    depend on. The result may hold other metrics of the same nodes. The nodes of one position in
+    PROFILE_EVERY are timed.
+    """
+    if split_metrics(metrics)[0] and attackers_mask(board, not color, king_square(board, color), board.occupied):
+        # Only reachable for positions that did not arise from legal play.
+        from model.features import compile_game_metrics
+        return compile_game_metrics(board, metrics=metrics, color=color)
+    if next(PROFILED_POSITIONS):
+        return profile_metrics(board, color, metrics)
+
+    values = {}
+    result = {}
+    for node, function, inputs, is_metric, _ in evaluation_plan(metrics):
+        value = values[node] = function(board, color, *[values[input_node] for input_node in inputs])
+        if is_metric:
+            result.update(value)
+    return result
+
+
+def profile_metrics(board, color, metrics):
+    """
+    Same as compute_metrics, recording the time of each node.
+    """
+    values = {}
+    result = {}
+    start = time.perf_counter()
+    for node, function, inputs, is_metric, key in evaluation_plan(metrics):
+        value = values[node] = function(board, color, *[values[input_node] for input_node in inputs])
+        if is_metric:
+            result.update(value)
+        start = METRICS.lap(start, key)
+    METRICS.values[SAMPLED_POSITIONS_KEY] += 1
+    return result
+
+
+def compile_bitboard_metrics(board, color, metrics=METRIC_NAMES):
+    """
+    Compiles the *metrics* of compile_game_metrics for the given color using only bitboard arithmetic.
+    """
+    values = compute_metrics(board, color, metrics)
+    return {name: values[name] for name in metrics}
+
+
+def compile_game_metrics_bitboard(board, metrics=METRIC_NAMES):
+    """
+    Drop-in replacement for compile_game_metrics, evaluated for the player who just moved.
+    """
+    return compile_bitboard_metrics(board, not board.turn, metrics)
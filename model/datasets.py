@@ -0,0 +1,44 @@
+import numpy as np
+import tensorflow as tf
+
+# Datasets read rows of a corpus tensorized by model.tensorize, usually memory-mapped, so only the
+# rows of the chunks in flight are in memory. Chunks are read in parallel by tf.data and scaled on the fly.
+
+
+def make_dataset(X, lengths, labels, scalers, rows, batch_size=32, shuffle=False, cache=None, chunk_size=256,
+                 shuffle_buffer=10000, seed=42):
+    """
+    Returns a tf.data.Dataset of (scaled tensor, label) batches of the *rows* of a tensorized corpus.
+
+    Chunks of *chunk_size* games are read in parallel on all cores. With *shuffle* the chunks and the
+    games are reshuffled every epoch, otherwise the dataset keeps the order of *rows*. *cache* is None
+    for no caching, '' to cache the prepared games in memory after the first epoch or a file path prefix
+    for corpora larger than memory.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    labels = np.asarray(labels, dtype=np.float32)
+    _, max_moves, num_features = X.shape
+
+    def load_chunk(chunk):
+        chunk_rows = rows[chunk * chunk_size:(chunk + 1) * chunk_size]
+        return scalers.transform(X[chunk_rows], lengths[chunk_rows]), labels[chunk_rows]
+
+    def load(chunk):
+        X_chunk, y_chunk = tf.numpy_function(load_chunk, [chunk], (tf.float32, tf.float32))
+        X_chunk.set_shape((None, max_moves, num_features))
+        y_chunk.set_shape((None,))
+        return X_chunk, y_chunk
+
+    num_chunks = (len(rows) + chunk_size - 1) // chunk_size
+    dataset = tf.data.Dataset.range(num_chunks)
+    if shuffle and cache is None:
+        dataset = dataset.shuffle(num_chunks, seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.map(load, num_parallel_calls=tf.data.AUTOTUNE, deterministic=not shuffle).unbatch()
+    if cache is not None:
+        dataset = dataset.cache(cache)
+    if shuffle:
+        dataset = dataset.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+    # unbatch loses the number of batches, which Keras needs for its progress bar and epoch ends
+    num_batches = (len(rows) + batch_size - 1) // batch_size
+    dataset = dataset.batch(batch_size).apply(tf.data.experimental.assert_cardinality(num_batches))
+    return dataset.prefetch(tf.data.AUTOTUNE)
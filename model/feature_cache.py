@@ -0,0 +1,174 @@
+import json
+import sqlite3
+from collections import OrderedDict
+
+from model.bitboard_features import METRIC_NAMES
+
+# Bump whenever the definition of a metric changes, so stale entries are never served.
+CACHE_VERSION = 2
+DEFAULT_CACHE_PATH = 'data/feature_cache.sqlite'
+
+
+def position_key(fen):
+    """
+    Normalizes a FEN to its placement, turn, castling and en passant fields, dropping the move clocks
+    which do not affect any metric.
+    """
+    return ' '.join(fen.split(' ', 4)[:4])
+
+
+class FeatureCache:
+    """
+    Position metrics cache with an in-memory LRU in front of a persistent SQLite store.
+
+    Values are the metric values in METRIC_NAMES order, stored per feature backend so that a backend never
+    serves the values computed by another one, which would mask any difference between them. Lookups and
+    inserts are meant to be done by the parent process only, workers never open the database.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_memory_entries=200000):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.table = f'metrics_v{CACHE_VERSION}'
+        self.memory = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(f'CREATE TABLE IF NOT EXISTS {self.table} '
+                                '(backend TEXT NOT NULL, key TEXT NOT NULL, metrics TEXT NOT NULL, PRIMARY KEY (backend, key))')
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def __len__(self):
+        return self.connection.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+
+    def _remember(self, key, values):
+        self.memory[key] = values
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def get_many(self, fens, backend):
+        """
+        Returns the values cached for *backend* of each FEN, or None for the FENs that are not cached.
+        """
+        keys = [(backend, position_key(fen)) for fen in fens]
+        unique_keys = list(dict.fromkeys(keys))
+        found = {}
+        for key in unique_keys:
+            values = self.memory.get(key)
+            if values is not None:
+                self.memory.move_to_end(key)
+                found[key] = values
+
+        missing = [key for key in unique_keys if key not in found]
+        from_disk = set()
+        for start in range(0, len(missing), 500):
+            chunk = missing[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self.connection.execute(f'SELECT key, metrics FROM {self.table} WHERE backend = ? AND key IN ({placeholders})',
+                                           [backend] + [key for _, key in chunk])
+            for key, metrics in rows:
+                key = (backend, key)
+                found[key] = tuple(json.loads(metrics))
+                from_disk.add(key)
+                self._remember(key, found[key])
+
+        results = []
+        for key in keys:
+            values = found.get(key)
+            if values is None:
+                self.misses += 1
+            elif key in from_disk:
+                self.disk_hits += 1
+            else:
+                self.memory_hits += 1
+            results.append(values)
+        return results
+
+    def get(self, fen, backend):
+        return self.get_many([fen], backend)[0]
+
+    def put_many(self, fens, values, backend):
+        """
+        Stores the metric values (in METRIC_NAMES order) of each FEN computed by *backend*.
+        """
+        rows = {}
+        for fen, metrics in zip(fens, values):
+            key = position_key(fen)
+            metrics = normalize_values(metrics)
+            self._remember((backend, key), metrics)
+            rows[key] = json.dumps(metrics)
+        self.connection.executemany(f'INSERT OR REPLACE INTO {self.table} (backend, key, metrics) VALUES (?, ?, ?)',
+                                    [(backend, key, metrics) for key, metrics in rows.items()])
+        self.connection.commit()
+
+    def put(self, fen, metrics, backend):
+        self.put_many([fen], [metrics], backend)
+
+    def stats(self):
+        """
+        Returns the hit and miss counters since the cache was opened.
+        """
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            'memory_entries': len(self.memory),
+        }
+
+
+def cached_evaluate(cache, fens, evaluate, backend, columns=None):
+    """
+    Returns the metric values of each FEN, taken from the values cached for *backend* when possible. The
+    distinct positions missing from the cache are evaluated once with evaluate(fens), which returns their
+    values in order, and stored.
+
+    With *columns*, the METRIC_NAMES indices of a feature set, cached values are reduced to those columns
+    and evaluate returns the values of those columns only. The cache holds complete rows, so these are
+    not stored.
+    """
+    values = cache.get_many(fens, backend)
+    if columns is not None:
+        values = [None if cached is None else tuple(cached[column] for column in columns) for cached in values]
+    missing = {}
+    for fen, cached in zip(fens, values):
+        if cached is None:
+            missing.setdefault(position_key(fen), fen)
+    if not missing:
+        return values
+
+    computed = [normalize_values(metrics) for metrics in evaluate(list(missing.values()))]
+    if columns is None:
+        cache.put_many(missing.values(), computed, backend)
+    computed = dict(zip(missing, computed))
+    return [cached if cached is not None else computed[position_key(fen)] for fen, cached in zip(fens, values)]
+
+
+def normalize_values(values):
+    """
+    Converts metric values to a tuple of Python numbers, integral values as ints, so that every
+    backend reads back the same types.
+    """
+    return tuple(int(value) if float(value).is_integer() else float(value) for value in values)
+
+
+def metrics_to_values(metrics):
+    return tuple(metrics[name] for name in METRIC_NAMES)
+
+
+def values_to_metrics(values):
+    return dict(zip(METRIC_NAMES, values))
@@ -0,0 +1,40 @@
+from model.bitboard_features import METRIC_NAMES
+
+# A feature set selects the metrics generate_features computes, by metric name or by the name of one of
+# the metric groups below, which are those of compile_game_metrics. Metrics outside of the set are never
+# computed: the python backend skips the groups, the bitboard backends the nodes of their METRIC_GRAPH,
+# that no selected metric needs.
+
+METRIC_GROUPS = {
+    'king_safety': ('Attacker Score', 'Defender Score', 'Pawn Shield', 'Open Files'),
+    'piece_activity': ('Mobility', 'Control of Center', 'Advanced Pawns', 'Developed Pieces', 'Space Control'),
+    'material_balance': ('Total Material',),
+    'positional_features': ('Doubled Pawns', 'Isolated Pawns', 'Passed Pawns', 'Piece Coordination'),
+    'tactical_features': ('Forks', 'Pins', 'Skewers', 'Threats')
+}
+
+
+def resolve_features(features=None):
+    """
+    Returns the metric names of a feature set, a metric or group name or a list of them, as a tuple in
+    METRIC_NAMES order. Every metric is selected when *features* is None.
+    """
+    if features is None:
+        return METRIC_NAMES
+    if isinstance(features, str):
+        features = [features]
+
+    selected = set()
+    for name in features:
+        if name in METRIC_GROUPS:
+            selected.update(METRIC_GROUPS[name])
+        elif name in METRIC_NAMES:
+            selected.add(name)
+        else:
+            raise ValueError(f"Unknown feature '{name}', expected a metric name or one of {list(METRIC_GROUPS)}")
+    return tuple(name for name in METRIC_NAMES if name in selected)
+
+
+def model_features(feature_names):
+    """ The metrics among the prepared feature names of a model, such as those of its FeatureScalers. """
+    return [name for name in feature_names if name in METRIC_NAMES]
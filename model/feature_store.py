@@ -0,0 +1,173 @@
+import json
+import os
+import re
+import shutil
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_STORE_PATH = 'data/features'
+
+
+def column_file_name(column):
+    return re.sub(r'[^0-9a-z]+', '_', column.lower()).strip('_')
+
+
+def is_numeric_sequence(values):
+    """
+    Whether a column of per-move lists holds numbers (stored as arrays) rather than strings such as
+    moves or FENs (stored with the game records).
+    """
+    for sequence in values:
+        if len(sequence):
+            return not isinstance(sequence[0], str)
+    return False
+
+
+class FeatureStore:
+    """
+    Columnar store of the per-player game features generated by generate_features.
+
+    Every numeric per-move column of a player is stored as a flat float32 values file plus an int64
+    offsets file holding where each game starts, so a game's sequence is a zero-copy slice of a
+    memory-mapped array. Game level values (URL, ratings, ...) and string sequences (moves, FENs) are
+    kept as JSON lines next to them. Games are appended batch by batch.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+
+    def player_path(self, username):
+        return os.path.join(self.path, username.lower())
+
+    def _read_meta(self, username):
+        try:
+            with open(os.path.join(self.player_path(username), 'meta.json'), encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self, username, meta):
+        path = os.path.join(self.player_path(username), 'meta.json')
+        with open(path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(meta, file)
+        os.replace(path + '.tmp', path)
+
+    def clear(self, username):
+        """
+        Removes all the stored games of a player.
+        """
+        shutil.rmtree(self.player_path(username), ignore_errors=True)
+
+    def append(self, username, df_games):
+        """
+        Appends a DataFrame of games, as returned by generate_features, to the player's store.
+        """
+        path = self.player_path(username)
+        os.makedirs(path, exist_ok=True)
+        meta = self._read_meta(username)
+        if meta is None:
+            sequences = [column for column in df_games.columns
+                         if len(df_games) and isinstance(df_games[column].iloc[0], (list, np.ndarray))]
+            numeric = [column for column in sequences if is_numeric_sequence(df_games[column])]
+            meta = {
+                'columns': list(df_games.columns),
+                'arrays': {column: column_file_name(column) for column in numeric},
+                'num_games': 0
+            }
+        elif list(df_games.columns) != meta['columns']:
+            raise ValueError(f"Columns of the appended games do not match the store of '{username}'")
+
+        num_games = meta['num_games']
+        for column, file_name in meta['arrays'].items():
+            sequences = df_games[column].tolist()
+            lengths = np.fromiter(map(len, sequences), dtype=np.int64, count=len(sequences))
+            values = np.concatenate([np.asarray(sequence, dtype=np.float32) for sequence in sequences] or
+                                    [np.zeros(0, dtype=np.float32)])
+            offsets_path = os.path.join(path, f'{file_name}.offsets.i64')
+            offsets = np.fromfile(offsets_path, dtype=np.int64) if num_games else np.zeros(1, dtype=np.int64)
+            # Anything past the recorded games was left by an interrupted append and is overwritten.
+            end = offsets[num_games]
+            with open(os.path.join(path, f'{file_name}.values.f32'), 'ab') as file:
+                file.truncate(end * np.dtype(np.float32).itemsize)
+                file.write(values.astype(np.float32, copy=False).tobytes())
+            np.concatenate([offsets[:num_games + 1], end + np.cumsum(lengths)]).tofile(offsets_path)
+
+        records_path = os.path.join(path, 'games.jsonl')
+        records = df_games.drop(columns=list(meta['arrays']))
+        if num_games:
+            with open(records_path, 'r+b') as file:
+                for _ in range(num_games):
+                    file.readline()
+                file.truncate()
+        with open(records_path, 'a' if num_games else 'w', encoding='utf-8') as file:
+            for record in records.to_dict('records'):
+                file.write(json.dumps(record, default=to_json) + '\n')
+
+        meta['num_games'] = num_games + len(df_games)
+        self._write_meta(username, meta)
+
+    def feature_columns(self, username):
+        """
+        Returns the numeric per-move columns of a player, in DataFrame order.
+        """
+        meta = self._read_meta(username)
+        if meta is None:
+            raise FileNotFoundError(f"No stored features for '{username}' in {self.path}")
+        return [column for column in meta['columns'] if column in meta['arrays']]
+
+    def load_arrays(self, username, columns=None):
+        """
+        Returns {column: (values, offsets)} for the numeric per-move columns of a player, the values
+        being memory-mapped. Game i of a column is values[offsets[i]:offsets[i + 1]].
+        """
+        meta = self._read_meta(username)
+        if meta is None:
+            raise FileNotFoundError(f"No stored features for '{username}' in {self.path}")
+        num_games = meta['num_games']
+        path = self.player_path(username)
+        arrays = {}
+        for column in (meta['arrays'] if columns is None else columns):
+            file_name = meta['arrays'][column]
+            offsets = np.fromfile(os.path.join(path, f'{file_name}.offsets.i64'), dtype=np.int64)[:num_games + 1]
+            if offsets[-1]:
+                values = np.memmap(os.path.join(path, f'{file_name}.values.f32'), dtype=np.float32, mode='r',
+                                   shape=(int(offsets[-1]),))
+            else:
+                values = np.zeros(0, dtype=np.float32)
+            arrays[column] = (values, offsets)
+        return arrays
+
+    def load(self, username, columns=None):
+        """
+        Loads a player's games as a DataFrame shaped like the one of generate_features, each per-move
+        feature cell being a zero-copy slice of the memory-mapped values.
+        """
+        meta = self._read_meta(username)
+        if meta is None:
+            raise FileNotFoundError(f"No stored features for '{username}' in {self.path}")
+        columns = columns or meta['columns']
+
+        data = {}
+        array_columns = [column for column in columns if column in meta['arrays']]
+        for column, (values, offsets) in self.load_arrays(username, array_columns).items():
+            data[column] = [values[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+        record_columns = [column for column in columns if column not in meta['arrays']]
+        if record_columns:
+            records = []
+            with open(os.path.join(self.player_path(username), 'games.jsonl'), encoding='utf-8') as file:
+                for _, line in zip(range(meta['num_games']), file):
+                    records.append(json.loads(line))
+            for column in record_columns:
+                data[column] = [record[column] for record in records]
+
+        return pd.DataFrame({column: data[column] for column in columns})
+
+
+def to_json(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
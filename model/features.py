@@ -1,276 +1,348 @@
 import chess
-import multiprocessing
+import functools
+from multiprocessing import shared_memory
+import numpy as np
 import pandas as pd
-
-def parallel_evaluate_fens(all_fens_with_index):
+import time
+
+from model.batch_features import evaluate_fens_batch
+from model.bitboard_features import (METRIC_NAMES, BB_ADVANCED, BB_CENTER, PIECE_VALUES, SKEWER_VALUES, popcount,
+                                     calculate_developed_pieces, compile_game_metrics_bitboard,
+                                     count_doubled_and_isolated_pawns, count_forks)
+from model.feature_cache import cached_evaluate, metrics_to_values, values_to_metrics
+from model.feature_sets import METRIC_GROUPS, resolve_features
+from model.instrumentation import METRICS, metric_key
+from model.worker_pool import FeaturePool
+
+# Metric functions take the color they are computed for explicitly and never change the turn of the board.
+BB_SQUARES = chess.BB_SQUARES
+BB_FILES = chess.BB_FILES
+BB_KING_ATTACKS = chess.BB_KING_ATTACKS
+# Squares in front of a pawn on its file, per color and square.
+BB_FRONT_SPANS = {
+    chess.WHITE: [BB_FILES[chess.square_file(square)] & ~((BB_SQUARES[square] << 1) - 1) for square in chess.SQUARES],
+    chess.BLACK: [BB_FILES[chess.square_file(square)] & (BB_SQUARES[square] - 1) for square in chess.SQUARES]
+}
+# Squares on a rank, file or diagonal through each square.
+BB_QUEEN_LINES = [chess.BB_RANK_ATTACKS[square][0] | chess.BB_FILE_ATTACKS[square][0] | chess.BB_DIAG_ATTACKS[square][0]
+                  for square in chess.SQUARES]
+# is_potential_skewer walks raw square offsets: north, south, east, west and the diagonals
+SKEWER_DIRECTIONS = (8, -8, 1, -1, 9, 7, -7, -9)
+
+def parallel_evaluate_fens(all_fens_with_index, backend='python', cache=None, pool=None):
     """
     Evaluates all FENs using multiple processes for efficiency.
-    """
-    num_cores = multiprocessing.cpu_count()
-    chunk_size = len(all_fens_with_index) // num_cores
-    fens_chunks = [all_fens_with_index[i:i + chunk_size] for i in range(0, len(all_fens_with_index), chunk_size)]
-
-    with multiprocessing.Pool(processes=num_cores) as pool:
-        results = pool.map(evaluate_positions, fens_chunks)
-
-    return [item for sublist in results for item in sublist]
-
-def evaluate_positions(fens_with_index):
+    With a FeatureCache only the positions missing from it are sent to the workers.
+    """
+    metrics = parallel_evaluate_fens_matrix([fen for _, fen in all_fens_with_index], backend=backend, cache=cache, pool=pool)
+    return [(game_index, values_to_metrics(values)) for (game_index, _), values in zip(all_fens_with_index, metrics.tolist())]
+
+def parallel_evaluate_fens_batch(fens, cache=None, pool=None):
+    """
+    Evaluates all FENs in batches using multiple processes and returns one (N, len(METRIC_NAMES))
+    float32 array, in the order of the given FENs.
+    With a FeatureCache only the positions missing from it are sent to the workers.
+    """
+    return parallel_evaluate_fens_matrix(fens, backend='batch', cache=cache, pool=pool)
+
+def parallel_evaluate_fens_matrix(fens, backend='batch', cache=None, pool=None, metrics=METRIC_NAMES):
+    """
+    Evaluates all FENs using multiple processes and returns one (N, len(metrics)) float32 array,
+    in the order of the given FENs, whose columns follow *metrics*, a tuple of metric names.
+    Workers write their rows straight into a shared memory matrix, so only the FENs are pickled.
+    With a FeatureCache only the positions missing from it are evaluated.
+
+    *pool* is a FeaturePool to reuse across calls, a temporary one is used when not given.
+    Inputs too small to be worth dispatching are evaluated in the calling process.
+    """
+    if cache is not None:
+        evaluate = lambda missing: parallel_evaluate_fens_matrix(missing, backend, pool=pool, metrics=metrics).tolist()
+        columns = None if metrics == METRIC_NAMES else [METRIC_NAMES.index(name) for name in metrics]
+        values = cached_evaluate(cache, fens, evaluate, backend, columns)
+        return np.array(values, dtype=np.float32).reshape(len(fens), len(metrics))
+
+    if pool is None:
+        with FeaturePool() as pool:
+            return parallel_evaluate_fens_matrix(fens, backend, pool=pool, metrics=metrics)
+
+    METRICS.add('parallel_positions', len(fens), backend=backend)
+    with METRICS.timer('parallel_evaluate', backend=backend):
+        if pool.runs_inline(len(fens)) or not metrics:
+            return evaluate_fens_matrix(fens, backend, metrics)
+        return evaluate_fens_on_pool(fens, backend, pool, metrics)
+
+def evaluate_fens_on_pool(fens, backend, pool, metrics=METRIC_NAMES):
+    """
+    Dispatches chunks of FENs to the workers of a FeaturePool, see parallel_evaluate_fens_matrix.
+    """
+    shape = (len(fens), len(metrics))
+    chunk_size = pool.chunk_size_for(len(fens))
+    shm = shared_memory.SharedMemory(create=True, size=shape[0] * shape[1] * np.dtype(np.float32).itemsize)
+    try:
+        tasks = ((shm.name, shape, start, fens[start:start + chunk_size], backend, metrics)
+                 for start in range(0, len(fens), chunk_size))
+        # Chunks finish in any order, each one knows where its rows go. Workers send back their counters.
+        for worker_metrics in pool.imap_unordered(evaluate_fens_into_shared_matrix, tasks):
+            METRICS.merge(worker_metrics)
+        # One contiguous copy out of the segment before it is released, per-game slices are views of it.
+        return np.ndarray(shape, dtype=np.float32, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+
+def evaluate_fens_into_shared_matrix(task):
+    """
+    Worker side of parallel_evaluate_fens_matrix: evaluates a chunk of FENs and writes their metrics
+    into the rows of the shared matrix starting at the chunk's ordinal. Returns the drained counters
+    of the worker.
+    """
+    cpu = time.process_time()
+    shm_name, shape, start, fens, backend, metrics = task
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        matrix = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+        matrix[start:start + len(fens)] = evaluate_fens_matrix(fens, backend, metrics)
+        del matrix
+    finally:
+        shm.close()
+    METRICS.add('worker_cpu_seconds', time.process_time() - cpu)
+    return METRICS.drain()
+
+def evaluate_fens_matrix(fens, backend='batch', metrics=METRIC_NAMES):
+    """
+    Evaluates a chunk of FENs and returns a (N, len(metrics)) float32 array of the *metrics* names.
+    The backend is 'batch' (evaluate_fens_batch) or any backend accepted by get_metrics_backend.
+    """
+    METRICS.add('positions', len(fens), backend=backend)
+    with METRICS.timer('evaluate', backend=backend):
+        if backend == 'batch':
+            return evaluate_fens_batch(fens, metrics)
+
+        compile_metrics = get_metrics_backend(backend)
+        matrix = np.zeros((len(fens), len(metrics)), dtype=np.float32)
+        if not metrics:
+            return matrix
+        for row, fen in zip(matrix, fens):
+            game_metrics = compile_metrics(chess.Board(fen), metrics=metrics)
+            row[:] = [game_metrics[name] for name in metrics]
+        return matrix
+
+def evaluate_positions(fens_with_index, backend='python', cache=None):
     """
     Evaluates a chunk of FENs using a chess engine to compute specific game metrics.
+    The backend is either 'python' (compile_game_metrics) or 'bitboard' (compile_game_metrics_bitboard).
+    With a FeatureCache cached positions are not evaluated again.
     """
+    if cache is not None:
+        fens = [fen for _, fen in fens_with_index]
+        evaluate = lambda missing: [metrics_to_values(metrics) for _, metrics in evaluate_positions(list(enumerate(missing)), backend)]
+        values = cached_evaluate(cache, fens, evaluate, backend)
+        return [(game_index, values_to_metrics(game_values)) for (game_index, _), game_values in zip(fens_with_index, values)]
+
+    compile_metrics = get_metrics_backend(backend)
     evaluations = []
     for (game_index, fen) in fens_with_index:
         board = chess.Board(fen)
-        game_metrics = compile_game_metrics(board)
+        game_metrics = compile_metrics(board)
         evaluations.append((game_index, game_metrics))
 
     return evaluations
 
-def compile_game_metrics(board):
+def get_metrics_backend(backend):
     """
-    Compiles various game metrics from the board state.
+    Returns the function that compiles the metrics of a single board for the given backend name.
     """
-    return {
-        **compute_king_safety_metrics(board),
-        **compute_piece_activity_metrics(board),
-        **compute_material_balance_metrics(board),
-        **compute_positional_features_metrics(board),
-        **compute_tactical_features(board)
+    backends = {
+        'python': compile_game_metrics,
+        'python-fast-forks': functools.partial(compile_game_metrics, forks_mode='fast'),
+        'bitboard': compile_game_metrics_bitboard
     }
+    if backend not in backends:
+        raise ValueError(f"Unknown feature backend '{backend}', expected one of {list(backends)}")
+    return backends[backend]
+
+class PositionAnalysis:
+    """
+    Intermediates of one position shared by the metric functions, each computed once on first use:
+    the board with *color*, the player the metrics are computed for, to move, its legal moves and per
+    color the attackers of every square. Metric functions called without one build their own.
+    """
+
+    def __init__(self, board, color):
+        self.board = board
+        self.color = color
+        self._board_to_move = None
+        self._legal_moves = None
+        self._attackers = {}
+
+    @property
+    def board_to_move(self):
+        """ The board itself when it is *color*'s turn, otherwise a copy with *color* to move. """
+        if self._board_to_move is None:
+            if self.board.turn == self.color:
+                self._board_to_move = self.board
+            else:
+                self._board_to_move = self.board.copy(stack=False)
+                self._board_to_move.turn = self.color
+        return self._board_to_move
+
+    @property
+    def legal_moves(self):
+        """ The legal moves of *color*. """
+        if self._legal_moves is None:
+            self._legal_moves = list(self.board_to_move.legal_moves)
+        return self._legal_moves
+
+    def attackers(self, color):
+        """ The attackers mask of *color* for each of the 64 squares. """
+        if color not in self._attackers:
+            # Scattered from the attacks of each piece of the color, the same masks as attackers_mask
+            board = self.board
+            attackers = [0] * 64
+            for square in chess.scan_forward(board.occupied_co[color]):
+                piece = BB_SQUARES[square]
+                for target in chess.scan_forward(board.attacks_mask(square)):
+                    attackers[target] |= piece
+            self._attackers[color] = attackers
+        return self._attackers[color]
+
+def compile_game_metrics(board, forks_mode='exact', metrics=METRIC_NAMES, color=None):
+    """
+    Compiles various game metrics from the board state for *color*, the player who just moved by default.
+    Only the metric groups (see METRIC_GROUPS) computing some of *metrics* are run, the result may hold
+    other metrics of the same groups. The groups share one PositionAnalysis. The time of each metric group
+    is recorded.
+    """
+    if color is None:
+        color = not board.turn
+    analysis = PositionAnalysis(board, color)
+    values = {}
+    start = time.perf_counter()
+    for group, compute_group in METRIC_GROUP_FUNCTIONS.items():
+        if not any(name in metrics for name in METRIC_GROUPS[group]):
+            continue
+        if group == 'tactical_features':
+            values.update(compute_group(board, color, forks_mode, metrics, analysis))
+        elif group == 'material_balance':
+            values.update(compute_group(board, color))
+        else:
+            values.update(compute_group(board, color, analysis))
+        start = METRICS.lap(start, METRIC_GROUP_KEYS[group])
+    return values
 
-# KING SAFETY FEATURES
-def compute_king_safety_metrics(board):
+def weighted_attackers(board, attackers, squares):
     """
-    Computes king safety metrics for both the player who just moved and the player who is about to move.
+    Sums the piece values of the attackers of every square of the *squares* mask, *attackers* being
+    a table of PositionAnalysis.attackers.
     """
-    current_turn_king_square = board.king(not board.turn)
-    next_turn_king_square = board.king(board.turn)
-    adjacent_squares_current = squares_around(current_turn_king_square)
-    adjacent_squares_next = squares_around(next_turn_king_square)
-    
-    piece_weights = {chess.PAWN: 1, chess.KNIGHT: 3, chess.BISHOP: 3, chess.ROOK: 5, chess.QUEEN: 9, chess.KING: 0}
-
-    # Calculate weighted threat score from attackers for the player who is about to move
-    attacker_score = 0
-    for square in adjacent_squares_next:
-        attackers = board.attackers(not board.turn, square)  # board.turn is the current player, so attackers are from the current player
-        attacker_score += sum(piece_weights.get(board.piece_at(attacker).piece_type, 0) for attacker in attackers)
-
-    # Calculate weighted defense score from defenders for the player who just moved
-    defender_score = 0
-    for square in adjacent_squares_current:
-        defenders = board.attackers(not board.turn, square)  # not board.turn are attackers from the next player, defending the current player
-        defender_score += sum(piece_weights.get(board.piece_at(defender).piece_type, 0) for defender in defenders)
+    score = 0
+    for square in chess.scan_forward(squares):
+        for attacker in chess.scan_forward(attackers[square]):
+            score += PIECE_VALUES[board.piece_type_at(attacker)]
+    return score
 
-    # Calculate pawn shield strength and open files for the king of the player who just moved
-    pawn_shield = compute_pawn_shield_strength(board, current_turn_king_square)
-    open_files = compute_open_files_near_king(board, current_turn_king_square)
+# KING SAFETY FEATURES
+def compute_king_safety_metrics(board, color, analysis=None):
+    """
+    Computes king safety metrics for both kings, from the attacks of the given color.
+    """
+    attackers = (analysis or PositionAnalysis(board, color)).attackers(color)
+    own_king = board.king(color)
+    enemy_king = board.king(not color)
 
     return {
-        'Attacker Score': attacker_score,
-        'Defender Score': defender_score,
-        'Pawn Shield': pawn_shield,
-        'Open Files': open_files
+        # Weighted threat score of the pieces of the color around the enemy king
+        'Attacker Score': weighted_attackers(board, attackers, BB_KING_ATTACKS[enemy_king]),
+        # Weighted defense score of the pieces of the color around their own king
+        'Defender Score': weighted_attackers(board, attackers, BB_KING_ATTACKS[own_king]),
+        'Pawn Shield': compute_pawn_shield_strength(board, own_king, color),
+        'Open Files': compute_open_files_near_king(board, own_king, color)
     }
 
-def squares_around(square):
-    """
-    Returns a list of all squares around a given square within the bounds of the board.
-    """
-    file = chess.square_file(square)
-    rank = chess.square_rank(square)
-    directions = [
-        (-1, -1), (-1, 0), (-1, 1),  # squares above
-        (0, -1),         (0, 1),     # squares to the left and right
-        (1, -1), (1, 0), (1, 1)      # squares below
-    ]
-    result = []
-    for df, dr in directions:
-        f, r = file + df, rank + dr
-        if 0 <= f < 8 and 0 <= r < 8:  # Ensure the new file and rank are on the board
-            result.append(chess.square(f, r))
-    return result
-
-def compute_pawn_shield_strength(board, king_square):
+def compute_pawn_shield_strength(board, king_square, color):
     """
     Evaluates the pawn structure around the king for shielding effectiveness.
     """
-    pawn_shield_strength = 0
-    friendly_pawns = board.pieces(chess.PAWN, not board.turn)
-    for pawn_square in friendly_pawns:
-        if chess.square_distance(pawn_square, king_square) == 1:
-            pawn_shield_strength += 1
-    return pawn_shield_strength
+    return popcount(board.pawns & board.occupied_co[color] & BB_KING_ATTACKS[king_square])
 
-def compute_open_files_near_king(board, king_square):
+def compute_open_files_near_king(board, king_square, color):
     """
     Counts the number of open or semi-open files adjacent to the king's file.
     """
     open_files = 0
     king_file = chess.square_file(king_square)
-    for file_offset in [-1, 0, 1]:
-        file = king_file + file_offset
-        if 0 <= file <= 7:
-            if is_file_open_or_semi_open(board, file, not board.turn):
-                open_files += 1
+    for file in range(max(king_file - 1, 0), min(king_file + 1, 7) + 1):
+        if is_file_open_or_semi_open(board, file, color):
+            open_files += 1
     return open_files
 
 def is_file_open_or_semi_open(board, file, color):
     """
     Determines if a file is open or semi-open for the given color.
     """
-    for rank in range(8):
-        square = chess.square(file, rank)
-        piece = board.piece_at(square)
-        if piece and piece.piece_type == chess.PAWN and piece.color == color:
-            return False
-    return True
+    return not board.pawns & board.occupied_co[color] & BB_FILES[file]
 
 # PIECE ACTIVITY FEATURES
-def compute_piece_activity_metrics(board):
+def compute_piece_activity_metrics(board, color, analysis=None):
     """
     Measures the activity level of pieces on the board, focusing on mobility, comprehensive control of the center
-    (including pawn influence), piece development, and strategic space control for the player who just moved.
+    (including pawn influence), piece development, and strategic space control for the given color.
     """
-    # Temporarily switch to the player who just moved
-    board.turn = not board.turn
-
-    center_squares = [chess.E4, chess.D4, chess.E5, chess.D5]
-    piece_values = {chess.PAWN: 1, chess.KNIGHT: 3, chess.BISHOP: 3, chess.ROOK: 5, chess.QUEEN: 9, chess.KING: 0}
-
-    mobility = sum(piece_values[board.piece_at(move.from_square).piece_type] for move in board.legal_moves)
-
-    control_of_center = 0
-    for square in center_squares:
-        if board.is_attacked_by(board.turn, square):
-            control_of_center += sum(piece_values.get(board.piece_at(attacker).piece_type, 0)
-                                     for attacker in board.attackers(board.turn, square)
-                                     if board.piece_at(attacker))
-        
-        piece = board.piece_at(square)
-        if piece and piece.color == board.turn:
-            control_of_center += piece_values.get(piece.piece_type, 0)
-
-    advanced_pawns = sum(1 for pawn in board.pieces(chess.PAWN, board.turn) 
-                         if (chess.square_rank(pawn) < 4 if board.turn == chess.BLACK else chess.square_rank(pawn) > 3))
-
-    developed_pieces = calculate_developed_pieces(board)
+    analysis = analysis or PositionAnalysis(board, color)
+    attackers = analysis.attackers(color)
+    own = board.occupied_co[color]
 
-    space_control = sum(1 for square in chess.SQUARES if board.is_attacked_by(board.turn, square))
+    mobility = 0
+    for move in analysis.legal_moves:
+        mobility += PIECE_VALUES[board.piece_type_at(move.from_square)]
 
-    board.turn = not board.turn
+    control_of_center = weighted_attackers(board, attackers, BB_CENTER)
+    for square in chess.scan_forward(own & BB_CENTER):
+        control_of_center += PIECE_VALUES[board.piece_type_at(square)]
 
     return {
         'Mobility': mobility,
         'Control of Center': control_of_center,
-        'Advanced Pawns': advanced_pawns,
-        'Developed Pieces': developed_pieces,
-        'Space Control': space_control
-    }
-
-def calculate_developed_pieces(board):
-    """
-    Counts the number of pieces moved from their initial positions, suggesting piece development.
-    """
-    initial_positions = get_initial_positions(board.turn)
-    developed_pieces = 0
-    for piece_type, positions in initial_positions.items():
-        for position in positions:
-            if board.piece_at(position) is None or board.piece_at(position).piece_type != piece_type:
-                developed_pieces += 1
-    return developed_pieces
-
-def get_initial_positions(color):
-    """
-    Returns the initial positions for all pieces based on color.
-    """
-    return {
-        chess.PAWN: [chess.A2, chess.B2, chess.C2, chess.D2, chess.E2, chess.F2, chess.G2, chess.H2] if color == chess.WHITE else [chess.A7, chess.B7, chess.C7, chess.D7, chess.E7, chess.F7, chess.G7, chess.H7],
-        chess.KNIGHT: [chess.B1, chess.G1] if color == chess.WHITE else [chess.B8, chess.G8],
-        chess.BISHOP: [chess.C1, chess.F1] if color == chess.WHITE else [chess.C8, chess.F8],
-        chess.ROOK: [chess.A1, chess.H1] if color == chess.WHITE else [chess.A8, chess.H8],
-        chess.QUEEN: [chess.D1] if color == chess.WHITE else [chess.D8],
-        chess.KING: [chess.E1] if color == chess.WHITE else [chess.E8]
+        'Advanced Pawns': popcount(board.pawns & own & BB_ADVANCED[color]),
+        'Developed Pieces': calculate_developed_pieces(board, color),
+        'Space Control': sum(1 for mask in attackers if mask)
     }
 
-def compute_material_balance_metrics(board):
+def compute_material_balance_metrics(board, color):
     """
-    Calculates the total material and imbalance between the players, from the perspective of the player
-    who just moved.
+    Calculates the total material and imbalance between the players, from the perspective of the given color.
     """
-    # Temporarily reverse the turn to evaluate from the perspective of the player who just moved
-    board.turn = not board.turn
-
-    # Initialize dictionaries to store piece counts
-    piece_counts = {color: {piece_type: len(board.pieces(piece_type, color)) for piece_type in chess.PIECE_TYPES}
-                    for color in [chess.WHITE, chess.BLACK]}
-
-    # Assign values to pieces for total material calculation
-    piece_values = {chess.PAWN: 1, chess.KNIGHT: 3, chess.BISHOP: 3, chess.ROOK: 5, chess.QUEEN: 9, chess.KING: 0}
-    total_material = sum((piece_counts[board.turn][pt] - piece_counts[not board.turn][pt]) * value
-                         for pt, value in piece_values.items() if pt != chess.KING)  # Kings are typically not counted
-
-    # Restore the original turn after calculations
-    board.turn = not board.turn
-
+    total_material = 0
+    for piece_type in chess.PIECE_TYPES:  # Kings are worth nothing
+        total_material += PIECE_VALUES[piece_type] * (popcount(board.pieces_mask(piece_type, color)) -
+                                                      popcount(board.pieces_mask(piece_type, not color)))
     return {
         'Total Material': total_material,
     }
 
 # POSITIONAL FEATURES
-def compute_positional_features_metrics(board):
+def compute_positional_features_metrics(board, color, analysis=None):
     """
     Assesses various positional features including pawn structure and piece coordination.
-    Calculations are done from the perspective of the player who just moved.
+    Calculations are done from the perspective of the given color.
     """
-    # Reverse turn to assess the state from the perspective of the player who just moved
-    board.turn = not board.turn
-
-    pawn_structure = compute_pawn_structure_metrics(board)
-    piece_coordination = compute_piece_coordination_metrics(board)
-    
-    # Restore the turn to the original state after calculation
-    board.turn = not board.turn
-
     return {
-        **pawn_structure,  # Merge dictionaries directly
-        'Piece Coordination': piece_coordination
+        **compute_pawn_structure_metrics(board, color),
+        'Piece Coordination': compute_piece_coordination_metrics(board, color, analysis)
     }
 
-
-def compute_pawn_structure_metrics(board):
+def compute_pawn_structure_metrics(board, color):
     """
-    Evaluates the pawn structure for strengths and weaknesses for the player who just moved.
+    Evaluates the pawn structure for strengths and weaknesses of the given color, one file mask at a time.
+    A pawn is passed when no enemy piece stands in front of it on its file.
     """
-    doubled_pawns = 0
-    isolated_pawns = 0
+    pawns = board.pawns & board.occupied_co[color]
+    enemy = board.occupied_co[not color]
+    doubled_pawns, isolated_pawns = count_doubled_and_isolated_pawns(pawns)
+    front_spans = BB_FRONT_SPANS[color]
     passed_pawns = 0
-    for square in board.pieces(chess.PAWN, board.turn):
-        file = chess.square_file(square)
-        rank = chess.square_rank(square)
-
-        # Check for doubled pawns
-        file_pawns = [sq for sq in board.pieces(chess.PAWN, board.turn) if chess.square_file(sq) == file]
-        if len(file_pawns) > 1 and square in file_pawns:
-            doubled_pawns += 1
-
-        # Check for isolated pawns
-        adjacent_files = []
-        if file > 0:
-            adjacent_files.extend([sq for sq in board.pieces(chess.PAWN, board.turn) if chess.square_file(sq) == file - 1])
-        if file < 7:
-            adjacent_files.extend([sq for sq in board.pieces(chess.PAWN, board.turn) if chess.square_file(sq) == file + 1])
-        if not adjacent_files:
-            isolated_pawns += 1
-
-        # Check for passed pawns
-        if board.turn == chess.WHITE:
-            ahead_squares = [chess.square(file, r) for r in range(rank + 1, 8)]
-        else:
-            ahead_squares = [chess.square(file, r) for r in range(rank - 1, -1, -1)]
-
-        if all(board.piece_at(sq) == None or board.piece_at(sq).color == board.turn for sq in ahead_squares):
+    for square in chess.scan_forward(pawns):
+        if not front_spans[square] & enemy:
             passed_pawns += 1
 
     return {
@@ -279,116 +351,105 @@ def compute_pawn_structure_metrics(board):
         'Passed Pawns': passed_pawns
     }
 
-
-def compute_piece_coordination_metrics(board):
+def compute_piece_coordination_metrics(board, color, analysis=None):
     """
     Measures how well pieces protect each other.
     """
+    attackers = (analysis or PositionAnalysis(board, color)).attackers(color)
     piece_coordination = 0
-    for square in board.piece_map():
-        if board.piece_at(square).color == board.turn:  # Ensure to count coordination for the current player's pieces
-            defended_pieces = sum(1 for defended_square in board.attackers(board.turn, square)
-                                  if board.piece_at(defended_square).color == board.turn)
-            piece_coordination += defended_pieces
-
+    for square in chess.scan_forward(board.occupied_co[color]):
+        piece_coordination += popcount(attackers[square])
     return piece_coordination
 
 # TACTICAL FEATURES
-def compute_tactical_features(board):
+def compute_tactical_features(board, color, forks_mode='exact', metrics=METRIC_NAMES, analysis=None):
     """
-    Computes tactical features based on the current board state for the player who just moved.
+    Computes tactical features based on the current board state for the given color.
+    Forks and threats, which walk every legal move, are only computed when in *metrics*.
     """
-    # Reverse turn to calculate for the player who just moved
-    board.turn = not board.turn
+    analysis = analysis or PositionAnalysis(board, color)
+    tactical = {}
+    if 'Forks' in metrics:
+        tactical['Forks'] = compute_forks(board, color, forks_mode, analysis)
+    if 'Pins' in metrics or 'Skewers' in metrics:
+        tactical['Pins'], tactical['Skewers'] = compute_pins_and_skewers(board, color)
+    if 'Threats' in metrics:
+        tactical['Threats'] = compute_threats(board, color, analysis)
+    return tactical
 
-    forks = compute_forks(board)
-    pins, skewers = compute_pins_and_skewers(board)
-    threats = compute_threats(board)
-
-    # Restore the original turn after calculations
-    board.turn = not board.turn
-
-    return {
-        'Forks': forks,
-        'Pins': pins,
-        'Skewers': skewers,
-        'Threats': threats
-    }
-
-def compute_forks(board):
+def compute_forks(board, color, mode='exact', analysis=None):
     """
     More accurately detects forks where a single piece attacks two or more high-value pieces.
+    The 'exact' mode plays every legal move on the board with the color to move, the 'fast' mode
+    (count_forks) looks up the attackers of each destination in attack tables without playing the moves.
     """
-    forks = 0
-    opponent_color = not board.turn
-    value_threshold = 3 
+    analysis = analysis or PositionAnalysis(board, color)
+    if mode == 'fast':
+        return count_forks(analysis.board_to_move, color)
+    if mode != 'exact':
+        raise ValueError(f"Unknown forks mode '{mode}', expected 'exact' or 'fast'")
 
-    for move in board.legal_moves:
+    forks = 0
+    board = analysis.board_to_move
+    for move in analysis.legal_moves:
         board.push(move)
-        moving_piece = board.piece_at(move.to_square)
-        if not moving_piece:
-            board.pop()
-            continue
-
-        attacked_squares = set()
-        for target_square in board.attackers(board.turn, move.to_square):
-            if board.piece_at(target_square) and board.color_at(target_square) == opponent_color:
-                attacked_squares.add(target_square)
-
-        if len(attacked_squares) >= 2 and any(board.piece_at(sq).piece_type >= value_threshold for sq in attacked_squares):
+        # Attackers of the moved piece are all enemy pieces, at least one of them a bishop, rook, queen or king
+        attackers = board.attackers_mask(not color, move.to_square)
+        if attackers & (attackers - 1) and attackers & (board.bishops | board.rooks | board.queens | board.kings):
             forks += 1
-
         board.pop()
     return forks
 
-def compute_pins_and_skewers(board):
+def compute_pins_and_skewers(board, color):
     """
-    Uses the board's pin and skewer information.
+    Counts the pieces pinned to the king of the given color and the potential skewers on the board.
     """
     pins = 0
     skewers = 0
-    for square in board.piece_map():
-        if board.is_pinned(board.turn, square):
+    king = board.king(color)
+    # Only pieces on a line through the king can be pinned to it
+    pinnable = board.occupied & BB_QUEEN_LINES[king] if king is not None else 0
+    for square in chess.scan_forward(board.occupied):
+        if BB_SQUARES[square] & pinnable and board.is_pinned(color, square):
             pins += 1
         if is_potential_skewer(board, square):
             skewers += 1
     return pins, skewers
 
-def compute_threats(board):
+def compute_threats(board, color, analysis=None):
     """
     Counts the number of legal moves that are captures, indicating direct attacks.
     """
+    analysis = analysis or PositionAnalysis(board, color)
+    board = analysis.board_to_move
     threats = 0
-    for move in board.legal_moves:
+    for move in analysis.legal_moves:
         if board.is_capture(move):
             threats += 1
     return threats
 
-def is_valid_square(square):
+def is_potential_skewer(board, square):
     """
-    Checks if a square index is within the valid range of a standard chess board.
+    Whether, along a raw square offset direction from the piece on *square*, the second piece met has the
+    piece's color and is worth more than the first one.
     """
-    return 0 <= square < 64  # Valid square indices range from 0 (a1) to 63 (h8)
-
-def is_potential_skewer(board, square):
-    piece = board.piece_at(square)
-    if piece is None:
+    piece_type = board.piece_type_at(square)
+    if piece_type is None:
         return False
 
-    directions = [8, -8, 1, -1, 9, 7, -7, -9]  # Directions for north, south, east, west, and diagonals
-    piece_values = {chess.PAWN: 1, chess.KNIGHT: 3, chess.BISHOP: 3, chess.ROOK: 5, chess.QUEEN: 9, chess.KING: 100}
-
-    for direction in directions:
-        first_piece_encountered = None
+    white = board.occupied_co[chess.WHITE]
+    occupied = board.occupied
+    is_white = bool(white & BB_SQUARES[square])
+    for direction in SKEWER_DIRECTIONS:
+        first_value = None
         current_square = square + direction
-        while is_valid_square(current_square):
-            encountered_piece = board.piece_at(current_square)
-            if encountered_piece:
-                if first_piece_encountered is None:
-                    first_piece_encountered = encountered_piece
-                elif encountered_piece.color == piece.color:
+        while 0 <= current_square < 64:
+            if occupied & BB_SQUARES[current_square]:
+                if first_value is None:
+                    first_value = SKEWER_VALUES[board.piece_type_at(current_square)]
+                elif bool(white & BB_SQUARES[current_square]) == is_white:
                     # Check if the first piece encountered is less valuable than this one
-                    if piece_values[encountered_piece.piece_type] > piece_values[first_piece_encountered.piece_type]:
+                    if SKEWER_VALUES[board.piece_type_at(current_square)] > first_value:
                         return True
                     break
                 else:
@@ -397,6 +458,17 @@ def is_potential_skewer(board, square):
 
     return False
 
+# Metric group -> the function computing its metrics, in the order compile_game_metrics runs them.
+METRIC_GROUP_FUNCTIONS = {
+    'king_safety': compute_king_safety_metrics,
+    'piece_activity': compute_piece_activity_metrics,
+    'material_balance': compute_material_balance_metrics,
+    'positional_features': compute_positional_features_metrics,
+    'tactical_features': compute_tactical_features
+}
+# Keys of the time counters of the metric groups, see Metrics.lap
+METRIC_GROUP_KEYS = {group: metric_key('metric_group_seconds', group=group) for group in METRIC_GROUP_FUNCTIONS}
+
 def encode_openings(game_opening):
     """
     Encodes the opening of a game into one-hot format based on a predefined list of openings.
@@ -420,25 +492,42 @@ def encode_openings(game_opening):
     encoded[matched_opening] = 1
     return encoded
 
-def generate_features(games):
+def generate_features(games, backend='python', cache=None, pool=None, features=None):
     """
     Generates features for each game and compiles them into a DataFrame.
+    All positions are evaluated into one columnar float32 array which is sliced per game using FEN offsets.
+    Games preprocessed with metrics already carry them and their FENs are not evaluated again.
+    An optional FeatureCache is consulted before evaluating any position, and an optional FeaturePool
+    is reused instead of starting new worker processes.
+
+    *features* is a feature set (see model.feature_sets.resolve_features), every metric by default.
+    Only its metrics are computed and become columns.
     """
+    metrics = resolve_features(features)
     all_fens_with_index = []
+    pending_games = []
     for game_index, game in enumerate(games):
-        all_fens_with_index.extend((game_index, fen) for fen in game['Player FENs'])
+        player_metrics = game.pop('Player Metrics', None)
+        if player_metrics is None:
+            all_fens_with_index.extend((game_index, fen) for fen in game['Player FENs'])
+            pending_games.append(game)
 
         openings = encode_openings(game['Opening'])
 
         for opening, value in openings.items():
             game[opening] = [value] * len(game['Player Moves'])
 
-    features = parallel_evaluate_fens(all_fens_with_index)
+        if player_metrics is not None:
+            game.update((name, player_metrics[name]) for name in metrics)
 
-    for game_index, game_metrics in features:
-        game = games[game_index]
-        for key, value in game_metrics.items():
-            game.setdefault(f'{key}', []).append(value)
+    if not all_fens_with_index:
+        return pd.DataFrame(games)
 
-    return pd.DataFrame(games)
+    matrix = parallel_evaluate_fens_matrix([fen for _, fen in all_fens_with_index], backend=backend, cache=cache,
+                                           pool=pool, metrics=metrics)
+    offsets = np.zeros(len(pending_games) + 1, dtype=np.int64)
+    np.cumsum([len(game['Player FENs']) for game in pending_games], out=offsets[1:])
+    for game, start, end in zip(pending_games, offsets[:-1], offsets[1:]):
+        game.update(zip(metrics, matrix[start:end].T.tolist()))
 
+    return pd.DataFrame(games)
@@ -0,0 +1,95 @@
+import chess
+
+from model.bitboard_features import (METRIC_NAMES, BB_HOME_SQUARES, PIECE_VALUES, BB_ADVANCED, popcount,
+                                     compute_metrics, compute_king_shelter_metrics, count_doubled_and_isolated_pawns,
+                                     count_passed_pawns, calculate_developed_pieces, pieces_by_type, split_metrics)
+
+# Home square -> (color whose development it counts for, piece type expected there).
+HOME_SQUARE_TYPES = {
+    square: (color, piece_type)
+    for color, homes in BB_HOME_SQUARES.items()
+    for piece_type, mask in homes
+    for square in chess.SquareSet(mask)
+}
+BB_ALL_HOME_SQUARES = chess.BB_RANK_1 | chess.BB_RANK_2 | chess.BB_RANK_7 | chess.BB_RANK_8
+
+
+class IncrementalMetrics:
+    """
+    Follows a game move by move on a single board and keeps the placement-only metrics up to date
+    incrementally, so positions never have to be serialized to FEN and parsed back.
+
+    Material changes only on captures and promotions, development only when a home square changes,
+    and the pawn structure and king shelter are recomputed only when the pawns or the king move.
+    """
+
+    def __init__(self, board):
+        self.board = board
+        self.material = {color: self._count_material(color) for color in chess.COLORS}
+        self.developed = {color: calculate_developed_pieces(board, color) for color in chess.COLORS}
+        # Per color, the last pawn (and king) bitboards seen and the metrics computed for them.
+        self._pawn_files = {color: (None, None) for color in chess.COLORS}
+        self._king_shelter = {color: (None, None) for color in chess.COLORS}
+
+    def _count_material(self, color):
+        own = self.board.occupied_co[color]
+        return sum(PIECE_VALUES[piece_type] * popcount(bb & own) for piece_type, bb in pieces_by_type(self.board))
+
+    def push(self, move):
+        """
+        Plays the move on the board and updates the incremental state.
+        """
+        board = self.board
+        mover = board.turn
+        if board.is_en_passant(move):
+            captured = chess.PAWN
+        else:
+            captured = board.piece_type_at(move.to_square)
+        before = [bb for _, bb in pieces_by_type(board)]
+
+        board.push(move)
+
+        if captured:
+            self.material[not mover] -= PIECE_VALUES[captured]
+        if move.promotion:
+            self.material[mover] += PIECE_VALUES[move.promotion] - PIECE_VALUES[chess.PAWN]
+
+        changed = 0
+        for (_, bb), previous in zip(pieces_by_type(board), before):
+            changed |= bb ^ previous
+        changed &= BB_ALL_HOME_SQUARES
+        for square in chess.SquareSet(changed):
+            color, piece_type = HOME_SQUARE_TYPES[square]
+            # A home square counts as developed whenever it does not hold its original piece type.
+            was_home = bool(before[piece_type - 1] & chess.BB_SQUARES[square])
+            is_home = board.piece_type_at(square) == piece_type
+            self.developed[color] += was_home - is_home
+
+    def metrics(self, metrics=METRIC_NAMES):
+        """
+        Returns the *metrics* of compile_game_metrics, a tuple of metric names, for the player who just moved.
+        Attack based metrics outside of *metrics* are not computed.
+        """
+        board = self.board
+        color = not board.turn
+        own = board.occupied_co[color]
+        own_pawns = board.pawns & own
+
+        pawns_seen, pawn_files = self._pawn_files[color]
+        if pawns_seen != own_pawns:
+            pawn_files = count_doubled_and_isolated_pawns(own_pawns)
+            self._pawn_files[color] = (own_pawns, pawn_files)
+
+        shelter_seen, king_shelter = self._king_shelter[color]
+        if shelter_seen != (own_pawns, board.kings & own):
+            king_shelter = compute_king_shelter_metrics(board, color)
+            self._king_shelter[color] = ((own_pawns, board.kings & own), king_shelter)
+
+        values = compute_metrics(board, color, split_metrics(metrics)[0])
+        values.update(king_shelter)
+        values['Doubled Pawns'], values['Isolated Pawns'] = pawn_files
+        values['Passed Pawns'] = count_passed_pawns(own_pawns, board.occupied_co[not color], color)
+        values['Advanced Pawns'] = popcount(own_pawns & BB_ADVANCED[color])
+        values['Developed Pieces'] = self.developed[color]
+        values['Total Material'] = self.material[color] - self.material[not color]
+        return {name: values[name] for name in metrics}
@@ -0,0 +1,179 @@
+import collections
+import contextlib
+import json
+import resource
+import time
+
+# Process-local counters of the feature pipeline, cheap enough to stay on: recording a value is one
+# dict update. Worker processes drain their counters into the result of each task and the parent merges
+# them, so the counters of the parent cover the whole pool. Counters are exported as Prometheus text or
+# as JSON records.
+
+PROMETHEUS_PREFIX = 'chess_'
+
+
+def metric_key(name, **labels):
+    """ The key of a counter in Metrics.values. """
+    return (name, tuple(sorted(labels.items())))
+
+
+class Metrics:
+    """
+    Sums of values keyed by a metric name and its labels.
+    """
+
+    def __init__(self):
+        self.values = collections.defaultdict(float)
+
+    def add(self, name, value, **labels):
+        self.values[metric_key(name, **labels)] += value
+
+    def lap(self, start, key):
+        """
+        Adds the seconds elapsed since *start* to the counter of *key*, see metric_key, and returns the
+        current time, the start of the next lap, so that consecutive sections are timed with one clock
+        read each. Meant for hot loops, whose keys are built once beforehand.
+        """
+        now = time.perf_counter()
+        self.values[key] += now - start
+        return now
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(f'{name}_seconds', time.perf_counter() - start, **labels)
+            self.add(f'{name}_calls', 1, **labels)
+
+    def get(self, name, **labels):
+        return self.values.get(metric_key(name, **labels), 0.0)
+
+    def drain(self):
+        """
+        Returns the counters as a picklable dict and resets them, see merge.
+        """
+        values = dict(self.values)
+        self.values.clear()
+        return values
+
+    def merge(self, values):
+        for key, value in values.items():
+            self.values[key] += value
+
+    def records(self):
+        """
+        Returns the counters as [{'metric': name, **labels, 'value': value}] records.
+        """
+        return [{'metric': name, **dict(labels), 'value': value} for (name, labels), value in sorted(self.values.items())]
+
+    def to_prometheus(self):
+        """
+        Returns the counters in the Prometheus text exposition format.
+        """
+        lines = []
+        by_name = collections.defaultdict(list)
+        for (name, labels), value in sorted(self.values.items()):
+            by_name[name].append((labels, value))
+        for name, samples in by_name.items():
+            metric = PROMETHEUS_PREFIX + name
+            lines.append(f'# TYPE {metric} {"gauge" if name.endswith("_bytes") else "counter"}')
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{value}"' for key, value in labels)
+                lines.append(f'{metric}{{{label_text}}} {value:.9g}' if labels else f'{metric} {value:.9g}')
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics()
+
+
+def reset_metrics():
+    METRICS.values.clear()
+
+
+def positions_per_second():
+    """
+    Returns {backend: positions per second} of the feature evaluations, per worker (CPU bound
+    evaluation time summed across processes) and across the pool (wall time of the dispatching calls).
+    """
+    throughput = {}
+    for (name, labels), positions in list(METRICS.values.items()):
+        if name == 'positions':
+            seconds = METRICS.values.get(('evaluate_seconds', labels))
+            throughput.setdefault(dict(labels)['backend'], {})['per_worker'] = positions / seconds if seconds else None
+        elif name == 'parallel_positions':
+            seconds = METRICS.values.get(('parallel_evaluate_seconds', labels))
+            throughput.setdefault(dict(labels)['backend'], {})['pool'] = positions / seconds if seconds else None
+    return throughput
+
+
+def peak_rss_bytes():
+    """ Peak resident set size of the process so far, ru_maxrss being in kilobytes on Linux. """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def clocks():
+    """ Wall time, CPU time of the process and CPU time reported by the feature workers so far. """
+    return time.perf_counter(), time.process_time(), METRICS.get('worker_cpu_seconds')
+
+
+def record_stage(name, wall, cpu, start_peak_rss, log=None, **labels):
+    """
+    Records a finished stage of *wall* and *cpu* seconds, and writes it to the *log* file as one JSON line
+    when given. The peak RSS is the one of the process so far, which only says something about a stage
+    through its growth from *start_peak_rss*, the peak when the stage started.
+    """
+    peak_rss = peak_rss_bytes()
+    record = {'stage': name, **labels, 'wall_s': wall, 'cpu_s': cpu, 'process_peak_rss_bytes': peak_rss,
+              'peak_rss_growth_bytes': peak_rss - start_peak_rss}
+    METRICS.add('stage_wall_seconds', wall, stage=name, **labels)
+    METRICS.add('stage_cpu_seconds', cpu, stage=name, **labels)
+    METRICS.values[('process_peak_rss_bytes', ())] = peak_rss
+    if log is not None:
+        log.write(json.dumps({'time': time.time(), **record}) + '\n')
+        log.flush()
+    return record
+
+
+def elapsed(start):
+    wall, cpu, worker_cpu = clocks()
+    return wall - start[0], cpu - start[1] + worker_cpu - start[2]
+
+
+@contextlib.contextmanager
+def stage(name, log=None, **labels):
+    """
+    Records the wall time, CPU time and peak RSS growth of a pipeline stage. CPU time includes the time
+    the feature workers reported for the tasks of the stage.
+    """
+    start_peak_rss = peak_rss_bytes()
+    start = clocks()
+    try:
+        yield
+    finally:
+        record_stage(name, *elapsed(start), start_peak_rss, log=log, **labels)
+
+
+def iter_stages(items, name, label, key, log=None):
+    """
+    Yields *items*, recording the time spent producing and consuming runs of consecutive items with the
+    same *key* as one stage labelled {label: key}. For lazily produced items, like the per-player feature
+    batches of stream_features, where a run only ends once the first item of the next one was produced.
+    """
+    current, wall, cpu = None, 0.0, 0.0
+    start_peak_rss = peak_rss_bytes()
+    start = clocks()
+    for item in items:
+        item_key = key(item)
+        if item_key != current and current is not None:
+            record_stage(name, wall, cpu, start_peak_rss, log=log, **{label: current})
+            wall, cpu = 0.0, 0.0
+            start_peak_rss = peak_rss_bytes()
+        current = item_key
+        yield item
+        item_wall, item_cpu = elapsed(start)
+        wall, cpu = wall + item_wall, cpu + item_cpu
+        start = clocks()
+    if current is not None:
+        record_stage(name, wall, cpu, start_peak_rss, log=log, **{label: current})
@@ -0,0 +1,188 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+# A NumPy forward pass of the models built by model.training.build_model: an optional Masking layer,
+# stacked Keras LSTM layers and Dense layers. Weights are exported once from the saved .keras model into an .npz file
+# next to it, so that scoring processes load them without importing TensorFlow.
+
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'tanh': np.tanh,
+    'sigmoid': lambda x: 1 / (1 + np.exp(-x))
+}
+
+
+def runtime_path(model_path):
+    """
+    Path of the weights exported next to a model, data/{player}_model.keras -> data/{player}_model.npz.
+    """
+    return model_path.rsplit('.keras', 1)[0] + '.npz'
+
+
+def export_model(model_path, path=None):
+    """
+    Exports the layer configurations and weights of a saved .keras model for NumpyModel.
+    Returns the path of the exported file.
+    """
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(model_path)
+    layers, weights = [], {}
+    for index, layer in enumerate(model.layers):
+        config = layer.get_config()
+        kind = type(layer).__name__
+        if kind == 'Masking':
+            layers.append({'kind': kind, 'mask_value': config['mask_value'], 'activation': 'linear'})
+        elif kind == 'LSTM':
+            if config['go_backwards'] or config['stateful'] or not config['use_bias']:
+                raise ValueError(f'Unsupported LSTM configuration in layer {layer.name}')
+            layers.append({'kind': kind, 'activation': config['activation'],
+                           'recurrent_activation': config['recurrent_activation'],
+                           'return_sequences': config['return_sequences']})
+        elif kind == 'Dense' and config['use_bias']:
+            layers.append({'kind': kind, 'activation': config['activation']})
+        else:
+            raise ValueError(f'Unsupported layer {layer.name} of type {kind}')
+        if not {layers[-1]['activation'], layers[-1].get('recurrent_activation', 'linear')} <= ACTIVATIONS.keys():
+            raise ValueError(f'Unsupported activation in layer {layer.name}')
+        for position, weight in enumerate(layer.get_weights()):
+            weights[f'layer{index}_{position}'] = weight.astype(np.float32)
+
+    path = path or runtime_path(model_path)
+    np.savez(path, layers=np.array(json.dumps(layers)), **weights)
+    return path
+
+
+class NumpyModel:
+    """
+    CPU inference of an exported model with NumPy only. LSTM gates follow the Keras kernel layout,
+    input, forget, cell and output, and input projections are done for all moves at once. Like Keras,
+    masked moves leave the LSTM states unchanged.
+    """
+
+    def __init__(self, path):
+        with np.load(path) as data:
+            self.layers = json.loads(str(data['layers']))
+            for index, layer in enumerate(self.layers):
+                num_weights = {'Masking': 0, 'LSTM': 3, 'Dense': 2}[layer['kind']]
+                layer['weights'] = [data[f'layer{index}_{position}'] for position in range(num_weights)]
+
+    def _lstm(self, X, mask, layer):
+        kernel, recurrent_kernel, bias = layer['weights']
+        activation = ACTIVATIONS[layer['activation']]
+        recurrent_activation = ACTIVATIONS[layer['recurrent_activation']]
+        units = recurrent_kernel.shape[0]
+
+        inputs = X @ kernel + bias
+        h = np.zeros((len(X), units), dtype=np.float32)
+        c = np.zeros((len(X), units), dtype=np.float32)
+        outputs = np.empty((len(X), X.shape[1], units), dtype=np.float32) if layer['return_sequences'] else None
+        for step in range(X.shape[1]):
+            z = inputs[:, step] + h @ recurrent_kernel
+            i = recurrent_activation(z[:, :units])
+            f = recurrent_activation(z[:, units:2 * units])
+            o = recurrent_activation(z[:, 3 * units:])
+            c_next = f * c + i * activation(z[:, 2 * units:3 * units])
+            h_next = o * activation(c_next)
+            if mask is None:
+                c, h = c_next, h_next
+            else:
+                c = np.where(mask[:, step, None], c_next, c)
+                h = np.where(mask[:, step, None], h_next, h)
+            if outputs is not None:
+                outputs[:, step] = h
+        return outputs if outputs is not None else h
+
+    def __call__(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        mask = None
+        for layer in self.layers:
+            if layer['kind'] == 'Masking':
+                mask = np.any(X != layer['mask_value'], axis=-1)
+                X = np.where(mask[:, :, None], X, np.float32(0))
+            elif layer['kind'] == 'LSTM':
+                X = self._lstm(X, mask, layer)
+                if not layer['return_sequences']:
+                    mask = None
+            else:
+                kernel, bias = layer['weights']
+                X = ACTIVATIONS[layer['activation']](X @ kernel + bias)
+        return X
+
+    def predict(self, X):
+        """
+        Returns the model probabilities of a batch of scaled tensors.
+        """
+        return self(X)[:, 0]
+
+
+def check_parity(model_path, X, atol=1e-5):
+    """
+    Compares the Keras and NumPy probabilities on a tensor. Returns the largest absolute difference,
+    raises ValueError when it exceeds *atol*.
+    """
+    import tensorflow as tf
+
+    expected = tf.keras.models.load_model(model_path)(X, training=False).numpy()[:, 0]
+    difference = float(np.abs(NumpyModel(runtime_path(model_path)).predict(X) - expected).max())
+    if difference > atol:
+        raise ValueError(f'NumPy runtime differs from the Keras model by {difference:.2e}')
+    return difference
+
+
+def startup_time(runtime, model_path):
+    """
+    Seconds a fresh interpreter takes to import the runtime and load the model.
+    """
+    if runtime == 'numpy':
+        code = f'from model.numpy_runtime import NumpyModel; NumpyModel({runtime_path(model_path)!r})'
+    else:
+        code = f'import tensorflow as tf; tf.keras.models.load_model({model_path!r})'
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], check=True, capture_output=True,
+                   cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export a saved model to the NumPy runtime, check it and compare runtimes.')
+    parser.add_argument('--model', default='data/sevolod_model.keras')
+    parser.add_argument('--batch-size', type=int, default=1, help='Batch size of the latency comparison')
+    parser.add_argument('--repeats', type=int, default=200)
+    args = parser.parse_args()
+
+    import tensorflow as tf
+
+    path = export_model(args.model)
+    print(f"Exported {args.model} to {path}")
+
+    model = tf.keras.models.load_model(args.model)
+    _, max_moves, num_features = model.input_shape
+    X = np.random.default_rng(0).standard_normal((256, max_moves, num_features)).astype(np.float32)
+    print(f"Parity on {len(X)} random games: max abs difference {check_parity(args.model, X):.2e}")
+
+    signature = [tf.TensorSpec((None, max_moves, num_features), tf.float32)]
+    forward = tf.function(lambda X: model(X, training=False), input_signature=signature)
+    runtimes = {'tensorflow': lambda X: forward(X).numpy(), 'numpy': NumpyModel(path).predict}
+    batch = X[:args.batch_size]
+    for runtime, predict in runtimes.items():
+        predict(batch)
+        latencies = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            predict(batch)
+            latencies.append(time.perf_counter() - start)
+        latencies = np.array(latencies) * 1000
+        print(f"{runtime}: startup {startup_time(runtime, args.model):.2f}s, batch of {len(batch)} "
+              f"p50 {np.percentile(latencies, 50):.2f}ms p99 {np.percentile(latencies, 99):.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
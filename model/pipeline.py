@@ -0,0 +1,46 @@
+from model.features import generate_features
+from model.preprocess import preprocess_games
+
+# Streaming ingestion: monthly archives -> preprocessed games -> feature batches. Every stage is a
+# generator, so only one batch of games (plus the archives buffered by the fetcher) is held at a time.
+
+
+def iter_preprocessed_games(archives, analyzed_game_type, with_metrics=False, parser='pgn', pool=None, features=None):
+    """
+    Preprocesses the games of (username, year, month, games) archives one archive at a time, in
+    parallel when a FeaturePool is given, and yields (username, processed_game) in order. With metrics,
+    only those of the *features* set are computed.
+    """
+    for username, _, _, games in archives:
+        for processed_game in preprocess_games(games, analyzed_game_type, username, with_metrics, parser, pool,
+                                               features):
+            yield username, processed_game
+
+
+def iter_game_batches(processed_games, batch_size=256):
+    """
+    Groups (username, processed_game) pairs into lists of at most *batch_size* games of a single
+    player and yields (username, games).
+    """
+    batch_username, batch = None, []
+    for username, game in processed_games:
+        if batch and (username != batch_username or len(batch) >= batch_size):
+            yield batch_username, batch
+            batch = []
+        batch_username = username
+        batch.append(game)
+    if batch:
+        yield batch_username, batch
+
+
+def stream_features(archives, analyzed_game_type, batch_size=256, with_metrics=False, parser='pgn', pool=None,
+                    features=None, **feature_kwargs):
+    """
+    Yields (username, DataFrame) feature batches for a stream of (username, year, month, games)
+    archives, such as the one of chess_com.async_api.iter_archives. The FeaturePool is used for both
+    preprocessing and features. The *features* set applies to both as well, *feature_kwargs* are passed
+    to generate_features.
+    """
+    processed_games = iter_preprocessed_games(archives, analyzed_game_type, with_metrics, parser, pool, features)
+    for username, games in iter_game_batches(processed_games, batch_size):
+        yield username, generate_features(games, pool=pool, features=features, **feature_kwargs)
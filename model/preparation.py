@@ -1,51 +1,69 @@
 import numpy as np
-from sklearn.preprocessing import StandardScaler, MinMaxScaler
-
-def drop_and_rename_columns(df_games):
-    """ Drop unused columns and rename some for clarity. """
-    columns_to_drop = ['URL', 'Color', 'Result', 'Opening', 'Player Rating', 'Opponent Rating',
-                       'Move Numbers', 'Player Moves', 'Opponent Moves', 'Opponent Time Spent', 'Player FENs', 'Opponent FENs']
-    
-    df_games.drop(columns=columns_to_drop, inplace=True)
-    df_games.rename(columns={'Player Time Spent': 'Time Spent'}, inplace=True)
-    return df_games
-
-def scale_features(df_games):
-    """ Apply standardization or normalization to specific features within list structure. """
-    features_standardize = ['Time Spent', 'Mobility', 'Control of Center', 'Space Control', 'Forks', 'Threats']
-    features_normalize = ['Attacker Score', 'Defender Score', 'Pawn Shield', 'Open Files', 'Advanced Pawns',
-                          'Developed Pieces','Total Material', 'Piece Coordination', 'Doubled Pawns', 
-                          'Isolated Pawns', 'Passed Pawns', 'Pins', 'Skewers']
-
-    scaler = StandardScaler()
-    min_max_scaler = MinMaxScaler()
-
-    for feature in features_standardize:
-        combined_list = np.concatenate(df_games[feature].tolist())
-        scaled_list = scaler.fit_transform(combined_list.reshape(-1, 1)).flatten()
-        lengths = df_games[feature].apply(len)
-        positions = np.cumsum(lengths)
-        df_games[feature] = [list(scaled_list[pos-length:pos]) for pos, length in zip(positions, lengths)]
-
-    for feature in features_normalize:
-        combined_list = np.concatenate(df_games[feature].tolist())
-        scaled_list = min_max_scaler.fit_transform(combined_list.reshape(-1, 1)).flatten()
-        lengths = df_games[feature].apply(len)
-        positions = np.cumsum(lengths)
-        df_games[feature] = [list(scaled_list[pos-length:pos]) for pos, length in zip(positions, lengths)]
-
-    return df_games
-
-def filter_games(df_games):
-    """ Filter out games with fewer than 10 moves and trim long games to 40 moves. """
-    df_games = df_games[df_games['Time Spent'].apply(len) >= 10]
-    df_games = df_games.apply(lambda x: x.apply(lambda y: y[:40] if len(y) > 40 else y))
-    return df_games
-
-def prepare_data(df_games):
-    """ Main function to prepare data by invoking modular functions. """
-    df_games = drop_and_rename_columns(df_games)
-    df_games = scale_features(df_games)
-    df_games = filter_games(df_games)
-
-    return df_games
+
+# Prepared data is a dense (games, max_moves, features) float32 tensor, zero padded after each game's
+# last move, plus the vector of game lengths. Features follow the column order of generate_features.
+# Features are scaled with the scaler kinds below by model.scalers.FeatureScalers.
+
+COLUMNS_TO_DROP = ['URL', 'Color', 'Result', 'Opening', 'Player Rating', 'Opponent Rating',
+                   'Move Numbers', 'Player Moves', 'Opponent Moves', 'Opponent Time Spent', 'Player FENs', 'Opponent FENs']
+COLUMNS_TO_RENAME = {'Player Time Spent': 'Time Spent'}
+
+FEATURES_STANDARDIZE = ['Time Spent', 'Mobility', 'Control of Center', 'Space Control', 'Forks', 'Threats']
+FEATURES_NORMALIZE = ['Attacker Score', 'Defender Score', 'Pawn Shield', 'Open Files', 'Advanced Pawns',
+                      'Developed Pieces','Total Material', 'Piece Coordination', 'Doubled Pawns',
+                      'Isolated Pawns', 'Passed Pawns', 'Pins', 'Skewers']
+
+def feature_names(columns):
+    """ Names of the prepared features for the given generate_features columns, in tensor order. """
+    return [COLUMNS_TO_RENAME.get(column, column) for column in columns if column not in COLUMNS_TO_DROP]
+
+def to_arrays(df_games):
+    """ Converts the per-move list columns of a DataFrame into {column: (values, offsets)} ragged arrays. """
+    arrays = {}
+    for column in df_games.columns:
+        if column in COLUMNS_TO_DROP:
+            continue
+        sequences = df_games[column].tolist()
+        offsets = np.zeros(len(sequences) + 1, dtype=np.int64)
+        np.cumsum([len(sequence) for sequence in sequences], out=offsets[1:])
+        values = np.concatenate([np.asarray(sequence, dtype=np.float32) for sequence in sequences] or
+                                [np.zeros(0, dtype=np.float32)])
+        arrays[column] = (values, offsets)
+    return arrays
+
+def playable_games(arrays, min_moves=10):
+    """ Indices of the games of {column: (values, offsets)} ragged arrays with at least *min_moves* moves. """
+    _, time_offsets = arrays['Player Time Spent']
+    return np.flatnonzero(np.diff(time_offsets) >= min_moves)
+
+def prepare_arrays(arrays, max_moves=40, min_moves=10, games=None):
+    """
+    Builds the prepared tensor from {column: (values, offsets)} ragged arrays, such as those of
+    FeatureStore.load_arrays. Games with fewer than *min_moves* moves are filtered out and the others
+    truncated to *max_moves*, or only the games at the *games* indices are taken, in that order.
+    Values are left unscaled, scaling is done by model.scalers.FeatureScalers fitted on the training games.
+
+    Returns the (games, max_moves, features) float32 tensor and the int64 lengths of the games.
+    """
+    columns = [column for column in arrays if column not in COLUMNS_TO_DROP]
+    keep = playable_games(arrays, min_moves) if games is None else np.asarray(games, dtype=np.int64)
+
+    steps = np.arange(max_moves)
+    X = np.zeros((len(keep), max_moves, len(columns)), dtype=np.float32)
+    lengths = np.zeros(len(X), dtype=np.int64)
+    for index, column in enumerate(columns):
+        values, offsets = arrays[column]
+        starts = offsets[:-1][keep]
+        feature_lengths = np.minimum(offsets[1:][keep] - starts, max_moves)
+        lengths = np.maximum(lengths, feature_lengths)
+        if not len(values):
+            continue
+        mask = steps < feature_lengths[:, None]
+        positions = np.minimum(starts[:, None] + steps, len(values) - 1)
+        X[:, :, index] = np.where(mask, values[positions], 0)
+
+    return X, lengths
+
+def prepare_data(df_games, max_moves=40, min_moves=10):
+    """ Main function to prepare data from a generate_features DataFrame, see prepare_arrays. """
+    return prepare_arrays(to_arrays(df_games), max_moves, min_moves)
@@ -1,7 +1,26 @@
 import re
 import io
+import functools
+import math
+import chess
 import chess.pgn
 
+from model.bitboard_features import iter_squares, pieces_by_type
+from model.feature_sets import resolve_features
+from model.incremental_features import IncrementalMetrics
+from model.worker_pool import MIN_GAMES_PER_TASK, TASKS_PER_WORKER
+
+CLOCK_PATTERN = re.compile(r'\[%clk (\d+:\d+:\d+(\.\d+)?)\]')
+# One tag pair line, with the blank lines before it.
+HEADER_PATTERN = re.compile(r'\s*\[(\w+)\s+"((?:[^"\\]|\\.)*)"\][^\S\n]*$', re.MULTILINE)
+# Movetext tokens: a {comment} or any other run of non-space characters.
+MOVETEXT_PATTERN = re.compile(r'\{([^}]*)\}|([^\s{}]+)')
+MOVE_NUMBER_PATTERN = re.compile(r'^\d+\.+')
+RESULTS = {'1-0', '0-1', '1/2-1/2', '*'}
+EMPTY_RUN_PATTERN = re.compile(r'1{2,8}')
+PIECE_SYMBOLS = {color: {piece_type: chess.piece_symbol(piece_type).upper() if color else chess.piece_symbol(piece_type)
+                         for piece_type in chess.PIECE_TYPES} for color in chess.COLORS}
+
 def identify_result(result, player_color):
     if result == '1-0':
         if player_color == "white":
@@ -26,26 +45,102 @@ def convert_pgn_clock_to_seconds(clock_str):
     h, m, s = clock_str.split(':')
     return int(h) * 3600 + int(m) * 60 + float(s)
 
-def extract_time_from_node(node):
-    clock_pattern = re.compile(r'\[%clk (\d+:\d+:\d+(\.\d+)?)\]')
-    match = clock_pattern.search(node.comment)
+def extract_time_from_comment(comment):
+    match = CLOCK_PATTERN.search(comment)
     if match:
         clock_str = match.group(1)
         return convert_pgn_clock_to_seconds(clock_str)
     return None
 
+def extract_time_from_node(node):
+    return extract_time_from_comment(node.comment)
+
+def tokenize_pgn(pgn):
+    """
+    Lightweight PGN reader for games that only need their headers, mainline moves and clocks.
+    Returns the headers and a list of (SAN, clock comment) pairs, or None for games it does not
+    handle (variations, custom start positions, variants) or in which it finds no moves, which are
+    left to chess.pgn.
+    """
+    if '\r' in pgn:
+        pgn = pgn.replace('\r\n', '\n').replace('\r', '\n')
+    # The headers are the tag pair lines at the start, the movetext follows the last one, with or
+    # without a blank line in between.
+    headers = {}
+    headers_end = 0
+    match = HEADER_PATTERN.match(pgn)
+    while match is not None:
+        headers[match.group(1)] = match.group(2)
+        headers_end = match.end()
+        match = HEADER_PATTERN.match(pgn, headers_end)
+    movetext = pgn[headers_end:]
+    if 'FEN' in headers or headers.get('Variant', 'Standard') != 'Standard':
+        return None
+
+    moves = []
+    for match in MOVETEXT_PATTERN.finditer(movetext):
+        comment, token = match.groups()
+        if comment is not None:
+            if moves:
+                san, previous = moves[-1]
+                moves[-1] = (san, previous + ' ' + comment if previous else comment)
+            continue
+        if token[0] == '$':
+            continue
+        if token[0] in '();%':
+            # Variations and rest-of-line comments are left to chess.pgn.
+            return None
+        token = MOVE_NUMBER_PATTERN.sub('', token)
+        if not token or token in RESULTS:
+            continue
+        moves.append((token.rstrip('!?'), ''))
+    if not moves:
+        return None
+    return headers, moves
+
+def board_to_fen(board):
+    """
+    Same as board.fen(), with the piece placement built from the piece bitboards rather than
+    square by square.
+    """
+    cells = ['1'] * 64
+    for color in chess.COLORS:
+        own, symbols = board.occupied_co[color], PIECE_SYMBOLS[color]
+        for piece_type, bb in pieces_by_type(board):
+            symbol = symbols[piece_type]
+            for square in iter_squares(bb & own):
+                cells[square] = symbol
+    placement = '/'.join(''.join(cells[rank:rank + 8]) for rank in range(56, -1, -8))
+    placement = EMPTY_RUN_PATTERN.sub(lambda run: str(len(run.group())), placement)
+
+    ep_square = board.ep_square if board.ep_square is not None and board.has_legal_en_passant() else None
+    return ' '.join((placement, 'w' if board.turn else 'b', board.castling_xfen(),
+                     chess.SQUARE_NAMES[ep_square] if ep_square is not None else '-',
+                     str(board.halfmove_clock), str(board.fullmove_number)))
+
 def has_moves(game_obj: chess.pgn.Game):
     for _ in game_obj.mainline():
         return True
     return False
 
-def extract_moves_fens_and_times(game_obj: chess.pgn.Game, player_color):
-    board = game_obj.board()
+def extract_moves_fens_and_times(game_obj: chess.pgn.Game, player_color, with_metrics=False):
+    mainline = ((node.move, None, node.comment) for node in game_obj.mainline())
+    return extract_moves_fens_and_times_from(game_obj.board(), mainline, game_obj.headers["TimeControl"], player_color, with_metrics)
+
+def extract_moves_fens_and_times_from(board, mainline, time_control, player_color, with_metrics=False, features=None):
+    """
+    Walks (move, SAN, comment) triples of a game's mainline from *board*. Either the move or the SAN
+    may be None, the missing one is derived from the other. With metrics, those of the *features* set are
+    computed.
+    """
     player_moves, opponent_moves = [], []
     player_fens, opponent_fens = [], []
     player_times, opponent_times = [], []
+    # With metrics, the features of the player's positions are computed on this board as the game is walked
+    metrics = resolve_features(features)
+    player_metrics = {name: [] for name in metrics} if with_metrics else None
+    tracker = IncrementalMetrics(board) if with_metrics else None
 
-    time_control = game_obj.headers["TimeControl"]
     if '+' in time_control:
         initial_time, increment = map(int, time_control.split("+"))
     else:
@@ -56,14 +151,19 @@ def extract_moves_fens_and_times(game_obj: chess.pgn.Game, player_color):
     is_player_turn = (player_color == 'white')
 
     move_num = 0
-    for node in game_obj.mainline():
-        move = node.move
-        san_move = board.san(move) 
-        board.push(move)  
-        fen = board.fen()
-
-        # Extract time spent from node comment
-        time_spent = extract_time_from_node(node)
+    for move, san_move, comment in mainline:
+        if move is None:
+            move = board.parse_san(san_move)
+        if san_move is None:
+            san_move = board.san(move)
+        if tracker:
+            tracker.push(move)
+        else:
+            board.push(move)
+        fen = board_to_fen(board)
+
+        # Extract time spent from the move comment
+        time_spent = extract_time_from_comment(comment)
         if time_spent is not None:
             if is_player_turn:
                 # Player's move
@@ -72,6 +172,9 @@ def extract_moves_fens_and_times(game_obj: chess.pgn.Game, player_color):
                 player_moves.append(san_move)
                 player_fens.append(fen)
                 player_times.append(round(time_diff, 1))
+                if tracker:
+                    for name, value in tracker.metrics(metrics).items():
+                        player_metrics[name].append(value)
             else:
                 # Opponent's move
                 time_diff = opponent_last_time - time_spent + increment
@@ -85,29 +188,44 @@ def extract_moves_fens_and_times(game_obj: chess.pgn.Game, player_color):
 
     total_moves_count = move_num // 2 + move_num % 2
 
-    return total_moves_count, player_moves, player_times, opponent_moves, opponent_times, player_fens, opponent_fens
-
-def preprocess_game(game, analyzed_game_type, username):
-    pgn_reader = io.StringIO(game.get('pgn', ''))
-    game_obj  = chess.pgn.read_game(pgn_reader)
-    if not has_moves(game_obj):
-        return None
+    return total_moves_count, player_moves, player_times, opponent_moves, opponent_times, player_fens, opponent_fens, player_metrics
 
-    url = game_obj.headers['Link']
+def preprocess_game(game, analyzed_game_type, username, with_metrics=False, parser='pgn', features=None):
+    """
+    Preprocesses one chess.com game. With parser='tokens' the PGN is read by tokenize_pgn, which skips
+    building the chess.pgn game tree, and chess.pgn is only used for games it does not handle.
+    With metrics, only those of the *features* set (see model.feature_sets) are computed.
+    """
     game_type = game['time_class']
     if game_type != analyzed_game_type:
         return None
 
-    player_color = 'white' if game_obj.headers['White'].lower() == username.lower() else 'black'
-    result = identify_result(game_obj.headers['Result'], player_color)
-    opening = extract_opening_name(game_obj.headers['ECOUrl'])
-    player_rating = game_obj.headers['WhiteElo' if player_color == 'white' else 'BlackElo']
-    opponent_rating = game_obj.headers['BlackElo' if player_color == 'white' else 'WhiteElo']
+    tokens = tokenize_pgn(game.get('pgn', '')) if parser == 'tokens' else None
+    if tokens is not None:
+        headers, moves = tokens
+        board = chess.Board()
+        mainline = ((None, san, comment) for san, comment in moves)
+    else:
+        pgn_reader = io.StringIO(game.get('pgn', ''))
+        game_obj  = chess.pgn.read_game(pgn_reader)
+        if game_obj is None or not has_moves(game_obj):
+            return None
+        headers = game_obj.headers
+        board = game_obj.board()
+        mainline = ((node.move, None, node.comment) for node in game_obj.mainline())
+
+    url = headers['Link']
+
+    player_color = 'white' if headers['White'].lower() == username.lower() else 'black'
+    result = identify_result(headers['Result'], player_color)
+    opening = extract_opening_name(headers['ECOUrl'])
+    player_rating = headers['WhiteElo' if player_color == 'white' else 'BlackElo']
+    opponent_rating = headers['BlackElo' if player_color == 'white' else 'WhiteElo']
     
-    moves_count, player_moves, player_times, opponent_moves, opponent_times, player_fens, opponent_fens = extract_moves_fens_and_times(game_obj, player_color)
+    moves_count, player_moves, player_times, opponent_moves, opponent_times, player_fens, opponent_fens, player_metrics = extract_moves_fens_and_times_from(board, mainline, headers['TimeControl'], player_color, with_metrics, features)
 
     if moves_count > 2:
-        return {
+        processed_game = {
             'URL': url, 
             'Color': player_color,
             'Result': result, 
@@ -122,13 +240,21 @@ def preprocess_game(game, analyzed_game_type, username):
             'Player FENs': player_fens, 
             'Opponent FENs': opponent_fens
         }
+        if player_metrics is not None:
+            processed_game['Player Metrics'] = player_metrics
+        return processed_game
     else:
         return None
         
-def preprocess_games(games, analyzed_game_type, username):
-    processed_games = []
-    for game in games:
-        processed_game = preprocess_game(game, analyzed_game_type, username)
-        if processed_game:
-            processed_games.append(processed_game)
-    return processed_games
+def preprocess_games(games, analyzed_game_type, username, with_metrics=False, parser='pgn', pool=None, features=None):
+    """
+    Preprocesses a list of games, in parallel on a FeaturePool when given. The order of the games is kept.
+    """
+    preprocess = functools.partial(preprocess_game, analyzed_game_type=analyzed_game_type, username=username,
+                                   with_metrics=with_metrics, parser=parser, features=features)
+    if pool is None or pool.processes == 1 or len(games) <= MIN_GAMES_PER_TASK:
+        processed_games = map(preprocess, games)
+    else:
+        chunk_size = max(MIN_GAMES_PER_TASK, math.ceil(len(games) / (pool.processes * TASKS_PER_WORKER)))
+        processed_games = pool.imap(preprocess, games, chunk_size)
+    return [processed_game for processed_game in processed_games if processed_game]
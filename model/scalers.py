@@ -0,0 +1,102 @@
+import json
+
+import numpy as np
+
+from model.preparation import FEATURES_NORMALIZE, FEATURES_STANDARDIZE
+
+
+class FeatureScalers:
+    """
+    Per-feature scalers of prepared (games, moves, features) tensors, fitted once on the training
+    corpus and saved next to the model so that inference applies the same scaling without refitting.
+
+    Standardized features use the mean and standard deviation of the fitted moves, normalized ones
+    their min and max, like StandardScaler and MinMaxScaler. Statistics are accumulated with
+    partial_fit, so the corpus can be fed one player (or batch) at a time.
+    """
+
+    def __init__(self, feature_names):
+        self.feature_names = list(feature_names)
+        num_features = len(self.feature_names)
+        self.count = 0
+        self.mean = np.zeros(num_features)
+        self.m2 = np.zeros(num_features)
+        self.min = np.full(num_features, np.inf)
+        self.max = np.full(num_features, -np.inf)
+        self._parameters = None
+
+    def partial_fit(self, X, lengths):
+        """
+        Updates the statistics with the moves of a prepared tensor, padding excluded.
+        """
+        mask = np.arange(X.shape[1]) < np.asarray(lengths)[:, None]
+        values = X[mask].astype(np.float64)
+        if not len(values):
+            return self
+
+        # Chan et al. parallel update of the running mean and sum of squared deviations
+        count = len(values)
+        mean = values.mean(axis=0)
+        m2 = ((values - mean) ** 2).sum(axis=0)
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * count / total
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * count / total
+        self.count = total
+        self.min = np.minimum(self.min, values.min(axis=0))
+        self.max = np.maximum(self.max, values.max(axis=0))
+        self._parameters = None
+        return self
+
+    def parameters(self):
+        """
+        Returns the (center, scale) float32 vectors applied by transform.
+        """
+        if self._parameters is None:
+            center = np.zeros(len(self.feature_names))
+            scale = np.ones(len(self.feature_names))
+            for index, feature in enumerate(self.feature_names):
+                if feature in FEATURES_STANDARDIZE:
+                    center[index], scale[index] = self.mean[index], np.sqrt(self.m2[index] / max(self.count, 1))
+                elif feature in FEATURES_NORMALIZE:
+                    center[index], scale[index] = self.min[index], self.max[index] - self.min[index]
+            # Constant features are only shifted, as the scikit-learn scalers do.
+            scale[scale == 0] = 1.0
+            self._parameters = (center.astype(np.float32), scale.astype(np.float32))
+        return self._parameters
+
+    def transform(self, X, lengths):
+        """
+        Returns the scaled copy of a prepared tensor, padding kept at zero.
+        """
+        center, scale = self.parameters()
+        mask = np.arange(X.shape[1]) < np.asarray(lengths)[:, None]
+        return np.where(mask[:, :, None], (X - center) / scale, np.float32(0)).astype(np.float32)
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump({
+                'feature_names': self.feature_names,
+                'count': self.count,
+                'mean': self.mean.tolist(),
+                'm2': self.m2.tolist(),
+                'min': self.min.tolist(),
+                'max': self.max.tolist()
+            }, file)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as file:
+            state = json.load(file)
+        scalers = cls(state['feature_names'])
+        scalers.count = state['count']
+        for name in ('mean', 'm2', 'min', 'max'):
+            setattr(scalers, name, np.array(state[name], dtype=np.float64))
+        return scalers
+
+
+def scalers_path(model_path):
+    """
+    Path of the scalers saved next to a model, data/{player}_model.keras -> data/{player}_scalers.json.
+    """
+    return model_path.rsplit('_model.keras', 1)[0] + '_scalers.json'
@@ -0,0 +1,116 @@
+import collections
+import os
+import time
+
+import numpy as np
+
+from model.feature_sets import model_features
+from model.features import generate_features
+from model.numpy_runtime import NumpyModel, runtime_path
+from model.preparation import feature_names, prepare_arrays, to_arrays
+from model.preprocess import preprocess_game
+from model.scalers import FeatureScalers, scalers_path
+
+
+def check_model_files(model_path, runtime):
+    """
+    Raises FileNotFoundError, saying how to produce them, when the files scoring a model with *runtime*
+    needs are missing: the scalers saved next to the model, and the model or its NumPy export.
+    """
+    path = runtime_path(model_path) if runtime == 'numpy' else model_path
+    if not os.path.exists(model_path) and not os.path.exists(path):
+        raise FileNotFoundError(f"No model at {model_path}, train one with `python main.py train`")
+    if not os.path.exists(scalers_path(model_path)):
+        raise FileNotFoundError(f"{model_path} has no feature scalers at {scalers_path(model_path)}, models trained "
+                                f"before the scalers were saved with them cannot score games. Train it again with "
+                                f"`python main.py train`, which saves the scalers and the NumPy export")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{model_path} has no NumPy export at {path}, export it with "
+                                f"`python -m model.numpy_runtime --model {model_path}` or use the tensorflow runtime")
+
+
+class GameScorer:
+    """
+    Scores single games against a saved model: the PGN is preprocessed with its features computed
+    while the game is replayed, scaled with the scalers saved next to the model and fed to the model,
+    which is loaded once and warmed up. Latencies of the last *latency_window* scores are kept.
+    Only the metrics the model was trained on are computed.
+
+    The 'tensorflow' runtime runs the saved .keras model, the 'numpy' runtime the weights exported
+    next to it by model.numpy_runtime.export_model, without importing TensorFlow.
+    """
+
+    def __init__(self, model_path, game_type='blitz', max_moves=40, min_moves=10, latency_window=10000,
+                 runtime='tensorflow'):
+        check_model_files(model_path, runtime)
+        self.scalers = FeatureScalers.load(scalers_path(model_path))
+        self.game_type = game_type
+        self.max_moves = max_moves
+        self.min_moves = min_moves
+        self.latencies = collections.deque(maxlen=latency_window)
+        self.features = model_features(self.scalers.feature_names)
+
+        num_features = len(self.scalers.feature_names)
+        if runtime == 'numpy':
+            self.model = NumpyModel(runtime_path(model_path))
+            self._forward = self.model
+        elif runtime == 'tensorflow':
+            import tensorflow as tf
+
+            # A compiled forward pass is an order of magnitude faster per call than eager execution.
+            # The first call traces it, keep that out of the measured latencies.
+            self.model = tf.keras.models.load_model(model_path)
+            signature = [tf.TensorSpec((None, max_moves, num_features), tf.float32)]
+            forward = tf.function(lambda X: self.model(X, training=False), input_signature=signature)
+            self._forward = lambda X: forward(X).numpy()
+        else:
+            raise ValueError(f'Unknown runtime {runtime}')
+        self.predict(np.zeros((1, max_moves, num_features), dtype=np.float32))
+
+    def featurize(self, pgn, username):
+        """
+        Returns the scaled (1, max_moves, features) tensor of a game played by *username*.
+        Raises ValueError for games that cannot be scored.
+        """
+        game = preprocess_game({'pgn': pgn, 'time_class': self.game_type}, self.game_type, username,
+                               with_metrics=True, parser='tokens', features=self.features)
+        if game is None:
+            raise ValueError('The game has too few moves to be scored')
+        arrays = to_arrays(generate_features([game], features=self.features))
+        if feature_names(arrays) != self.scalers.feature_names:
+            raise ValueError('The game features do not match the features of the model')
+        X, lengths = prepare_arrays(arrays, self.max_moves, self.min_moves)
+        if not len(X):
+            raise ValueError(f'Games with fewer than {self.min_moves} moves cannot be scored')
+        return self.scalers.transform(X, lengths)
+
+    def predict(self, X):
+        """
+        Returns the model probabilities of a batch of scaled tensors.
+        """
+        return self._forward(X)[:, 0]
+
+    def score(self, pgn, username):
+        """
+        Returns the probability that *username* is the player the model was trained on.
+        """
+        start = time.perf_counter()
+        probability = float(self.predict(self.featurize(pgn, username))[0])
+        self.record_latency(time.perf_counter() - start)
+        return probability
+
+    def record_latency(self, seconds):
+        self.latencies.append(seconds)
+
+    def latency_stats(self):
+        """
+        Returns the number of scores and their p50/p99 latencies in milliseconds.
+        """
+        latencies = np.array(self.latencies) * 1000
+        if not len(latencies):
+            return {'count': 0, 'p50_ms': None, 'p99_ms': None}
+        return {
+            'count': len(latencies),
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p99_ms': float(np.percentile(latencies, 99))
+        }
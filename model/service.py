@@ -0,0 +1,100 @@
+import argparse
+import asyncio
+import time
+
+from aiohttp import web
+
+from model.batching import MicroBatcher
+from model.instrumentation import METRICS, PROMETHEUS_PREFIX
+from model.scoring import GameScorer
+
+SCORER = web.AppKey('scorer', GameScorer)
+BATCHER = web.AppKey('batcher', MicroBatcher)
+
+
+async def handle_score(request):
+    """
+    POST /score with {"pgn": ..., "username": ...} returns {"probability": ...}.
+    Games are featurized in worker threads and their forward passes are batched by the MicroBatcher.
+    """
+    try:
+        payload = await request.json()
+        pgn, username = payload['pgn'], payload['username']
+    except (KeyError, TypeError, ValueError):
+        return web.json_response({'error': 'Expected a JSON object with "pgn" and "username"'}, status=400)
+    if not isinstance(pgn, str) or not isinstance(username, str):
+        return web.json_response({'error': '"pgn" and "username" must be strings'}, status=400)
+    scorer = request.app[SCORER]
+    start = time.perf_counter()
+    try:
+        X = await asyncio.to_thread(scorer.featurize, pgn, username)
+    except (KeyError, ValueError) as error:
+        return web.json_response({'error': f'Cannot score the game: {error}'}, status=400)
+    probability = await request.app[BATCHER].submit(X)
+    scorer.record_latency(time.perf_counter() - start)
+    return web.json_response({'probability': probability})
+
+
+async def handle_metrics(request):
+    return web.json_response({'latency': request.app[SCORER].latency_stats(), 'batching': request.app[BATCHER].metrics()})
+
+
+async def handle_prometheus(request):
+    """
+    GET /metrics/prometheus returns the feature counters of model.instrumentation and the scoring
+    latencies and batching metrics in the Prometheus text format.
+    """
+    lines = [METRICS.to_prometheus()]
+    stats = {f'latency_{key}': value for key, value in request.app[SCORER].latency_stats().items()}
+    stats.update({f'batching_{key}': value for key, value in request.app[BATCHER].metrics().items()})
+    for key, value in stats.items():
+        if value is not None:
+            lines.append(f'# TYPE {PROMETHEUS_PREFIX}scoring_{key} gauge\n{PROMETHEUS_PREFIX}scoring_{key} {value:.9g}\n')
+    return web.Response(text=''.join(lines), content_type='text/plain')
+
+
+async def handle_health(request):
+    return web.json_response({'status': 'ok'})
+
+
+async def run_batcher(app):
+    await app[BATCHER].start()
+    yield
+    await app[BATCHER].stop()
+
+
+def create_app(scorer, max_batch_size=32, max_wait=0.005):
+    app = web.Application()
+    app[SCORER] = scorer
+    app[BATCHER] = MicroBatcher(scorer.predict, max_batch_size, max_wait)
+    app.cleanup_ctx.append(run_batcher)
+    app.router.add_post('/score', handle_score)
+    app.router.add_get('/metrics', handle_metrics)
+    app.router.add_get('/metrics/prometheus', handle_prometheus)
+    app.router.add_get('/health', handle_health)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve game scores of a saved model over HTTP.')
+    parser.add_argument('--model', default='data/sevolod_model.keras')
+    parser.add_argument('--game-type', default='blitz')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--runtime', choices=['tensorflow', 'numpy'], default='tensorflow',
+                        help='numpy runs the weights exported by model.numpy_runtime without TensorFlow')
+    parser.add_argument('--max-batch-size', type=int, default=32, help='Most requests per forward pass')
+    parser.add_argument('--max-wait-ms', type=float, default=5, help='Longest wait for a batch to fill')
+    args = parser.parse_args()
+
+    print(f"Loading {args.model}...")
+    try:
+        scorer = GameScorer(args.model, game_type=args.game_type, runtime=args.runtime)
+    except FileNotFoundError as error:
+        raise SystemExit(str(error))
+    app = create_app(scorer, args.max_batch_size, args.max_wait_ms / 1000)
+    web.run_app(app, host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from model.preparation import feature_names, prepare_arrays
+from model.scalers import FeatureScalers
+
+DEFAULT_TENSOR_PATH = 'data/tensors'
+
+# The tensorization stage turns the selected games of the feature store into one unscaled
+# (games, max_moves, features) tensor, their lengths and labels. It runs once per corpus: the result is
+# saved as .npy files, the tensor being memory-mapped back, and training, validation and evaluation all
+# read rows of the same files.
+
+
+class GameLoader:
+    """
+    Prepares the tensors of stored games given as (player index, game index) rows into *players*.
+    Memory maps of the players are opened once.
+    """
+
+    def __init__(self, store, players, max_moves=40):
+        self.players = list(players)
+        self.max_moves = max_moves
+        self.arrays = [store.load_arrays(username) for username in self.players]
+
+    def load(self, games):
+        """
+        Returns the unscaled (games, max_moves, features) tensor and the lengths of *games*, in order.
+        """
+        games = np.asarray(games, dtype=np.int64).reshape(-1, 2)
+        X, lengths = None, np.zeros(len(games), dtype=np.int64)
+        for player in np.unique(games[:, 0]):
+            rows = np.flatnonzero(games[:, 0] == player)
+            X_player, lengths[rows] = prepare_arrays(self.arrays[player], self.max_moves, games=games[rows, 1])
+            if X is None:
+                X = np.zeros((len(games),) + X_player.shape[1:], dtype=np.float32)
+            X[rows] = X_player
+        return X, lengths
+
+
+def tensor_key(store, players, games, labels, max_moves):
+    """
+    Digest of everything a tensorized corpus depends on: the selected games, their labels and the
+    stored features of the players, whose meta file is rewritten by every append.
+    """
+    digest = hashlib.sha256(json.dumps([list(players), max_moves]).encode())
+    digest.update(np.ascontiguousarray(games, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(labels, dtype=np.float32).tobytes())
+    for username in players:
+        meta = os.stat(os.path.join(store.player_path(username), 'meta.json'))
+        digest.update(f'{meta.st_mtime_ns}:{meta.st_size}'.encode())
+    return digest.hexdigest()
+
+
+def tensor_files(path, name):
+    return {part: os.path.join(path, f'{name}.{part}.npy') for part in ('X', 'lengths', 'y')}
+
+
+def tensorize(store, players, games, labels, path=DEFAULT_TENSOR_PATH, name='corpus', max_moves=40,
+              chunk_size=4096):
+    """
+    Returns (X, lengths, y) of stored *games*, (player index, game index) rows into *players*, labelled
+    *labels*. X is memory-mapped from {path}/{name}.X.npy, which is only rebuilt when the games, labels
+    or stored features changed since it was written.
+    """
+    games = np.asarray(games, dtype=np.int64).reshape(-1, 2)
+    labels = np.asarray(labels, dtype=np.float32)
+    key = tensor_key(store, players, games, labels, max_moves)
+    files = tensor_files(path, name)
+    key_path = os.path.join(path, f'{name}.json')
+    try:
+        with open(key_path, encoding='utf-8') as file:
+            cached = json.load(file)['key'] == key
+    except FileNotFoundError:
+        cached = False
+
+    if not cached:
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(key_path):
+            os.remove(key_path)
+        num_features = len(feature_names(store.feature_columns(players[0])))
+        loader = GameLoader(store, players, max_moves)
+        X = np.lib.format.open_memmap(files['X'] + '.tmp', mode='w+', dtype=np.float32,
+                                      shape=(len(games), max_moves, num_features))
+        lengths = np.zeros(len(games), dtype=np.int64)
+        for start in range(0, len(games), chunk_size):
+            X[start:start + chunk_size], lengths[start:start + chunk_size] = loader.load(games[start:start + chunk_size])
+        X.flush()
+        del X
+        os.replace(files['X'] + '.tmp', files['X'])
+        np.save(files['lengths'], lengths)
+        np.save(files['y'], labels)
+        with open(key_path, 'w', encoding='utf-8') as file:
+            json.dump({'key': key}, file)
+
+    return np.load(files['X'], mmap_mode='r'), np.load(files['lengths']), np.load(files['y'])
+
+
+def fit_scalers(features, X, lengths, rows, chunk_size=4096):
+    """
+    Fits FeatureScalers of the *features* names on the *rows* of a tensorized corpus, one chunk at a time.
+    """
+    scalers = FeatureScalers(features)
+    rows = np.sort(rows)
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        scalers.partial_fit(X[chunk], lengths[chunk])
+    return scalers
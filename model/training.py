@@ -1,11 +1,12 @@
-import numpy as np
 import tensorflow as tf
-from keras.api.preprocessing.sequence import pad_sequences
 
-def build_model(input_shape):
-    """ Building a simple LSTM model """
-    model = tf.keras.Sequential([
-        tf.keras.layers.LSTM(64, input_shape=input_shape, return_sequences=True),
+def build_model(input_shape, mask_padding=True):
+    """ Building a simple LSTM model, skipping the zero padded moves after the end of each game """
+    layers = [tf.keras.Input(shape=input_shape)]
+    if mask_padding:
+        layers.append(tf.keras.layers.Masking(mask_value=0.0))
+    model = tf.keras.Sequential(layers + [
+        tf.keras.layers.LSTM(64, return_sequences=True),
         tf.keras.layers.LSTM(32),
         tf.keras.layers.Dense(16, activation='relu'),
         tf.keras.layers.Dense(1, activation='sigmoid')
@@ -13,25 +14,21 @@ def build_model(input_shape):
     model.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
     return model
 
-def train_model(data, max_moves=40):
-    """ Prepare the dataset and train the LSTM model """
-    feature_columns = [col for col in data.columns if col not in ['Label']]
-    
-    padded_features = []
-
-    for col in feature_columns:
-        feature_list = data[col].apply(lambda x: np.array(x, dtype=np.float32)).tolist()
-        padded_feature = pad_sequences(feature_list, maxlen=max_moves, dtype='float32', padding='post', truncating='post')
-        padded_features.append(padded_feature)
-    
-    X = np.stack(padded_features, axis=-1) 
-    y = data['Label'].values
-
-    input_shape = (X.shape[1], X.shape[2])
+def train_model(train_dataset, validation_dataset=None, epochs=10, patience=3):
+    """
+    Train the LSTM model on a tf.data.Dataset of (tensor, label) batches, see model.datasets.make_dataset.
+    With a validation dataset, training stops once the validation loss has not improved for *patience*
+    epochs and the best weights are kept.
+    """
+    input_shape = tuple(train_dataset.element_spec[0].shape[1:])
 
     model = build_model(input_shape)
     model.summary()
 
-    model.fit(X, y, epochs=10, batch_size=32, validation_split=0.2)
+    callbacks = []
+    if validation_dataset is not None:
+        callbacks.append(tf.keras.callbacks.EarlyStopping(monitor='val_loss', patience=patience,
+                                                          restore_best_weights=True))
+    model.fit(train_dataset, epochs=epochs, validation_data=validation_dataset, callbacks=callbacks)
 
     return model
@@ -0,0 +1,95 @@
+import math
+import multiprocessing
+from multiprocessing import resource_tracker
+
+from model.instrumentation import reset_metrics
+
+# Bounds on the number of positions sent to a worker per task.
+MIN_CHUNK_SIZE = 32
+MAX_CHUNK_SIZE = 2048
+# Tasks per worker when the chunk size is chosen automatically, so that slow chunks
+# (middlegames with many legal moves) do not leave the other workers idle.
+TASKS_PER_WORKER = 4
+# Games parsed per preprocessing task at least. A game costs as much as tens of positions, so chunks of
+# games are bounded on their own rather than by the chunk size, which is in positions.
+MIN_GAMES_PER_TASK = 8
+
+
+class FeaturePool:
+    """
+    Long-lived pool of feature workers, meant to be created once and shared by every
+    preprocess_games and generate_features call of a run. The processes are started on first use, or by
+    start().
+
+    *processes* defaults to the number of CPUs, *chunk_size* (positions per task) is chosen
+    from the input size when not given.
+    """
+
+    def __init__(self, processes=None, chunk_size=None):
+        self.processes = processes or multiprocessing.cpu_count()
+        self.chunk_size = chunk_size
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # After an error the workers may still be busy with tasks nobody will read, close() would wait for them
+        if exc_type is None:
+            self.close()
+        else:
+            self.terminate()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def terminate(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def chunk_size_for(self, num_items):
+        """
+        Returns the number of items per task for an input of *num_items*.
+        """
+        if self.chunk_size:
+            return self.chunk_size
+        chunk_size = math.ceil(num_items / (self.processes * TASKS_PER_WORKER))
+        return min(MAX_CHUNK_SIZE, max(MIN_CHUNK_SIZE, chunk_size))
+
+    def runs_inline(self, num_items):
+        """
+        Whether an input of *num_items* is too small to be worth dispatching to the workers.
+        """
+        return self.processes == 1 or num_items <= self.chunk_size_for(num_items)
+
+    def start(self):
+        """
+        Starts the worker processes now rather than on first use, unless the pool runs everything inline.
+        Call it before the process starts any thread: the workers are forked, and a child forked while
+        other threads run can inherit locks that no thread of its own will ever release.
+        """
+        if self.processes > 1:
+            self._get_pool()
+        return self
+
+    def _get_pool(self):
+        if self._pool is None:
+            # Workers attach to the shared memory segments of parallel_evaluate_fens_matrix, which registers
+            # them with the resource tracker. Started first, the tracker is shared with the workers, so the
+            # parent's unlink unregisters the segments everywhere instead of workers' own trackers
+            # reporting them as leaked at exit.
+            resource_tracker.ensure_running()
+            # Forked workers would otherwise send the parent's counters back with their own
+            self._pool = multiprocessing.Pool(processes=self.processes, initializer=reset_metrics)
+        return self._pool
+
+    def imap(self, func, tasks, chunksize=1):
+        return self._get_pool().imap(func, tasks, chunksize)
+
+    def imap_unordered(self, func, tasks):
+        return self._get_pool().imap_unordered(func, tasks)
@@ -1,17 +1,8 @@
-import pandas as pd
 import matplotlib.pyplot as plt
-import ast
 import numpy as np
 from scipy.stats import normaltest
 
-# Load the DataFrame
-df_games = pd.read_csv('data/sevolod_games.csv')
-
-def string_to_list(string_list):
-    try:
-        return ast.literal_eval(string_list)
-    except ValueError:
-        return [] 
+from model.feature_store import FeatureStore
 
 # List of features to analyze
 features_to_test = ['Player Time Spent', 'Attacker Score', 'Defender Score', 'Pawn Shield', 'Open Files',
@@ -19,6 +10,9 @@ features_to_test = ['Player Time Spent', 'Attacker Score', 'Defender Score', 'Pa
                     'Total Material', 'Doubled Pawns', 'Isolated Pawns', 'Passed Pawns', 'Piece Coordination',
                     'Forks', 'Pins', 'Skewers', 'Threats'] 
 
+# Load the per-move features, each game's scores being a slice of the memory-mapped arrays
+df_games = FeatureStore().load('sevolod', columns=features_to_test)
+
 max_moves = 40
 normality_results = {}
 
@@ -41,7 +35,6 @@ def calculate_averages(feature_name):
 
 # Testing each feature for normality
 for feature_name in features_to_test:
-    df_games[feature_name] = df_games[feature_name].apply(string_to_list)
     average_scores_per_move = calculate_averages(feature_name)
     average_scores = list(average_scores_per_move.values())
     